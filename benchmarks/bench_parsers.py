@@ -0,0 +1,54 @@
+# bench_parsers.py
+# Compares the Last.fm library page parsers on saved HTML fixtures.
+#   python benchmarks/bench_parsers.py [--repeat N] [fixture.html ...]
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import music_stats  # noqa: E402
+
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures", "lastfm_library*.html")
+BACKENDS = ("bs4", "xpath")
+
+
+def bench_backend(backend, pages, repeat):
+    rows = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            rows += len(music_stats.parse_library_rows(html, backend=backend))
+    seconds = time.perf_counter() - start
+    return {"rows": rows, "seconds": round(seconds, 4), "rows_per_second": round(rows / seconds, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark library page parsers.")
+    parser.add_argument("fixtures", nargs="*", help="HTML files (default: benchmarks/fixtures)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    paths = args.fixtures or sorted(glob.glob(FIXTURES))
+    pages = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            pages.append(f.read())
+
+    # both backends must agree before their speed means anything
+    for path, html in zip(paths, pages):
+        if music_stats.parse_library_rows(html, "bs4") != music_stats.parse_library_rows(html, "xpath"):
+            sys.exit(f"backends disagree on {path}")
+
+    results = {backend: bench_backend(backend, pages, args.repeat) for backend in BACKENDS}
+    for backend, r in results.items():
+        print(f"{backend:>6}: {r['rows']} rows in {r['seconds']}s -> {r['rows_per_second']} rows/s")
+    print(f"speedup: {results['xpath']['rows_per_second'] / results['bs4']['rows_per_second']:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# run_benchmarks.py
+# Offline benchmark suite: collectors replay recorded API responses from
+# benchmarks/fixtures through a local stub server, and the report functions
+# run against synthetic databases of several sizes. Results go to JSON so
+# runs can be compared across commits.
+#   python benchmarks/run_benchmarks.py [--sizes 10k,1M,10M] [--out results.json]
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+os.environ.setdefault("MPLBACKEND", "Agg")  # charts render off-screen, plt.show() returns immediately
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import matplotlib.pyplot as plt  # noqa: E402
+
+import find_itunes_avg  # noqa: E402
+import find_music_avg  # noqa: E402
+import find_weather_avg  # noqa: E402
+import generate_data  # noqa: E402
+import http_client  # noqa: E402
+import itunes_stats  # noqa: E402
+import music_stats  # noqa: E402
+import weather_stats  # noqa: E402
+
+BENCH_DIR = os.path.join(ROOT, "benchmarks")
+FIXTURES = os.path.join(BENCH_DIR, "fixtures")
+DATA_DIR = os.path.join(BENCH_DIR, ".data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+SIZES = {"10k": 1, "1M": 100, "10M": 1000}   # label -> generate_data scale (~10k top-track rows each)
+PERIOD = "7day"
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves the recorded responses; routes on path (and Last.fm's method param)."""
+
+    fixtures = {}
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(parts.query).items()}
+
+        if parts.path == "/2.0/":
+            if params.get("method") == "user.getRecentTracks":
+                self.reply(self.fixtures["lastfm_recenttracks.json"])
+            else:
+                self.reply(self.fixtures["lastfm_toptracks.json"])
+        elif parts.path.startswith("/user/") and parts.path.endswith("/library"):
+            self.reply(self.fixtures["lastfm_library.html"], "text/html; charset=utf-8")
+        elif parts.path == "/search":
+            # replay the recorded result under the searched name so every track is new
+            data = json.loads(self.fixtures["itunes_search.json"])
+            data["results"][0]["trackName"] = params.get("term", "")
+            self.reply(json.dumps(data))
+        elif parts.path == "/v1/search":
+            self.reply(self.fixtures["openmeteo_geocoding.json"])
+        elif parts.path == "/v1/archive":
+            self.reply(self.fixtures["openmeteo_archive.json"])
+        else:
+            self.send_error(404)
+
+    def reply(self, body, content_type="application/json"):
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextlib.contextmanager
+def stub_server():
+    StubHandler.fixtures = {name: load_fixture(name) for name in os.listdir(FIXTURES)}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    saved = (music_stats.LASTFM_API_ROOT, music_stats.LASTFM_WEB_ROOT, itunes_stats.ITUNES_SEARCH_URL,
+             weather_stats.GEOCODING_URL, weather_stats.ARCHIVE_URL)
+    music_stats.LASTFM_API_ROOT = f"{base}/2.0/"
+    music_stats.LASTFM_WEB_ROOT = base
+    itunes_stats.ITUNES_SEARCH_URL = f"{base}/search"
+    weather_stats.GEOCODING_URL = f"{base}/v1/search"
+    weather_stats.ARCHIVE_URL = f"{base}/v1/archive"
+    try:
+        yield base
+    finally:
+        (music_stats.LASTFM_API_ROOT, music_stats.LASTFM_WEB_ROOT, itunes_stats.ITUNES_SEARCH_URL,
+         weather_stats.GEOCODING_URL, weather_stats.ARCHIVE_URL) = saved
+        server.shutdown()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summarize(latencies, rows=None):
+    total = sum(latencies)
+    summary = {
+        "calls": len(latencies),
+        "total_seconds": round(total, 4),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+    if rows is not None:
+        summary["rows"] = rows
+        summary["rows_per_second"] = round(rows / total, 1) if total else 0.0
+    return summary
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    plt.close("all")
+    return seconds, result
+
+
+# ---- collectors ----
+
+def bench_music_stats(db_path, users):
+    latencies, rows = [], 0
+    for i in range(users):
+        seconds, result = timed(music_stats.music_stats, f"bench_user_{i}", "bench-key",
+                                period=PERIOD, db_path=db_path, max_new_rows=250)
+        latencies.append(seconds)
+        rows += result["rows_added_total"]
+    return summarize(latencies, rows)
+
+
+def bench_itunes_stats(db_path, calls, budget):
+    latencies, rows = [], 0
+    for _ in range(calls):
+        seconds, result = timed(itunes_stats.itunes_stats, {}, db_path, budget=budget)
+        latencies.append(seconds)
+        rows += result["tracks_found"]
+    return summarize(latencies, rows)
+
+
+def bench_weather(db_path, cities):
+    conn, cur = weather_stats.init_db(db_path)
+    latencies, rows = [], 0
+    for i in range(cities):
+        def fetch_and_store(city):
+            data, lat, lon = weather_stats.weather_stats(city, "2024-01-01", "2024-12-31", cur)
+            city_id = weather_stats.get_or_create_city(cur, conn, city, lat, lon)
+            return weather_stats.store_daily_weather(cur, conn, city_id, data, row_limit=None)
+
+        seconds, inserted = timed(fetch_and_store, f"Bench City {i}")
+        latencies.append(seconds)
+        rows += inserted
+    conn.close()
+    return summarize(latencies, rows)
+
+
+def bench_collectors(workdir, users, itunes_calls, itunes_budget, cities):
+    db_path = os.path.join(workdir, "collectors.db")
+    http_client.reset_stats()
+    with stub_server():
+        results = {
+            "music_stats": bench_music_stats(db_path, users),
+            "itunes_stats": bench_itunes_stats(db_path, itunes_calls, itunes_budget),
+            "weather_stats+store_daily_weather": bench_weather(db_path, cities),
+        }
+    results["http"] = http_client.get_stats()
+    return results
+
+
+# ---- synthetic databases ----
+
+def synthetic_db(label, scale):
+    """Builds (once) and returns the directory holding the synthetic data.db for a size."""
+    workdir = os.path.join(DATA_DIR, label)
+    path = os.path.join(workdir, "data.db")
+    if not os.path.exists(path):
+        os.makedirs(workdir, exist_ok=True)
+        print(f"building {label} synthetic database ...", flush=True)
+        if os.path.exists(path + ".tmp"):
+            os.remove(path + ".tmp")
+        generate_data.generate(path + ".tmp", scale)
+        os.replace(path + ".tmp", path)
+    return workdir
+
+
+def bench_reports(workdir, repeat):
+    path = os.path.join(workdir, "data.db")
+    results = {}
+
+    latencies = [timed(find_music_avg.find_music_average, "user_1", PERIOD, path,
+                       os.path.join(workdir, "music_avg.json"))[0] for _ in range(repeat)]
+    results["find_music_average"] = summarize(latencies)
+
+    latencies = [timed(find_itunes_avg.find_itunes_avg, {}, path)[0] for _ in range(repeat)]
+    results["find_itunes_avg"] = summarize(latencies)
+
+    latencies = [timed(find_weather_avg.find_weather_avg, "Ann Arbor", "2020-01-01", "2020-12-31", path,
+                       charts=False)[0]
+                 for _ in range(repeat)]
+    results["find_weather_avg"] = summarize(latencies)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument("--sizes", default="10k,1M,10M", help="synthetic database sizes for report benchmarks")
+    parser.add_argument("--users", type=int, default=20, help="music_stats() calls")
+    parser.add_argument("--itunes-calls", type=int, default=5)
+    parser.add_argument("--itunes-budget", type=int, default=25)
+    parser.add_argument("--cities", type=int, default=10, help="weather_stats() calls")
+    parser.add_argument("--repeat", type=int, default=5, help="calls per report function")
+    parser.add_argument("--out", help="results file (default: benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+    }
+
+    # report functions write their text/JSON outputs into the current directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            results["collectors"] = bench_collectors(workdir, args.users, args.itunes_calls,
+                                                     args.itunes_budget, args.cities)
+            results["reports"] = {}
+            for label in args.sizes.split(","):
+                label = label.strip()
+                results["reports"][label] = bench_reports(synthetic_db(label, SIZES[label]), args.repeat)
+        finally:
+            os.chdir(cwd)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{(commit or 'unknown')[:12]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print(json.dumps({k: v for k, v in results.items() if k in ("collectors", "reports")}, indent=2))
+    print(f"\nResults written to {out}")
+
+
+if __name__ == "__main__":
+    main()
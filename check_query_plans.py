@@ -0,0 +1,75 @@
+# check_query_plans.py
+# Runs EXPLAIN QUERY PLAN on every report query and fails if any of them
+# scans a whole table instead of searching an index.
+#   python check_query_plans.py [data.db]
+import argparse
+import sys
+
+import db
+import find_itunes_avg
+import find_music_avg
+import find_weather_avg
+import itunes_stats
+import music_stats  # noqa: F401  (imported for their schemas)
+import weather_stats  # noqa: F401
+
+# name -> (sql, sample parameters); the planner only needs their types.
+# find_all_music_averages() reads every user on purpose and is not listed.
+REPORT_QUERIES = {
+    "find_music_average: user id": (find_music_avg.USER_ID_SQL, ("user",)),
+    "find_music_average: period slice": (find_music_avg.REPORT_SLICE_SQL, (1, "7day")),
+    "find_weather_avg: city id": (find_weather_avg.CITY_ID_SQL, ("Ann Arbor",)),
+    "find_weather_avg: averages": (find_weather_avg.WEATHER_AVG_SQL, (1, "2024-01-01", "2024-12-31")),
+    "find_weather_avg: running totals": (find_weather_avg.ROLLUP_CUM_SQL, (1, "2024-12")),
+    "find_weather_avg: partial month": (find_weather_avg.WEATHER_PARTIAL_SQL, (1, "2024-01-05", "2024-01-31")),
+    "find_weather_avg: daily rows": (find_weather_avg.WEATHER_DAYS_SQL, (1, "2024-01-01", "2024-12-31")),
+    "find_itunes_avg: averages": (find_itunes_avg.SUMMARY_AVG_SQL, ()),
+    "find_itunes_avg: genre stats": (find_itunes_avg.GENRE_STATS_SQL, ()),
+    "itunes_chart: genres": (find_itunes_avg.GENRE_CHART_SQL, ()),
+    "itunes_chart: years": (find_itunes_avg.YEAR_CHART_SQL, ()),
+    # not reports, but they must stay off full scans just the same
+    "itunes_stats: new tracks": (itunes_stats.NEW_TRACKS_SQL, (0, 100)),
+    "itunes_stats: retries": (itunes_stats.RETRY_TRACKS_SQL, ("error", 0, -1, 0, 100)),
+    "itunes_stats: scan mark": (itunes_stats.SCAN_MARK_SQL, (0,)),
+}
+
+
+def query_plan(cur, sql, params):
+    cur.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    return [row[3] for row in cur.fetchall()]
+
+
+def full_scans(plan):
+    # "SCAN t" (or "SCAN TABLE t" on older SQLite) reads every row; SEARCH uses an index
+    return [step for step in plan if step.startswith("SCAN ") and step != "SCAN CONSTANT ROW"]
+
+
+def check_query_plans(db_path="data.db", verbose=False):
+    """Returns {query name: [full-scan steps]} for the report queries that scan."""
+    conn = db.reader(db_path)   # brings db_path up to the current schema first, report indexes included
+    cur = conn.cursor()
+
+    failures = {}
+    for name, (sql, params) in REPORT_QUERIES.items():
+        plan = query_plan(cur, sql, params)
+        scans = full_scans(plan)
+        if scans:
+            failures[name] = scans
+        if verbose or scans:
+            print(f"{'FAIL' if scans else 'ok  '} {name}")
+            for step in plan:
+                print(f"       {step}")
+    conn.close()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if a report query does a full table scan.")
+    parser.add_argument("db_path", nargs="?", default="data.db")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan, not just failures")
+    args = parser.parse_args()
+
+    failures = check_query_plans(args.db_path, args.verbose)
+    if failures:
+        sys.exit(f"{len(failures)} of {len(REPORT_QUERIES)} report queries scan a full table.")
+    print(f"All {len(REPORT_QUERIES)} report queries use indexes.")
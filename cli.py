@@ -0,0 +1,172 @@
+# cli.py
+# One entry point for the collectors and reports:
+#   python cli.py collect-music --api-key KEY
+#   python cli.py collect-itunes --budget 100
+#   python cli.py collect-weather --backfill 2024-01-01 2024-12-31
+#   python cli.py music-report RJ        (or --all)
+#   python cli.py itunes-report [--charts]
+#   python cli.py weather-report "Ann Arbor" 2024-01-01 2024-12-31 [--charts]
+# Each command imports only the modules it needs, so stats-only commands
+# never load pandas/seaborn/matplotlib.
+import argparse
+import os
+import sys
+
+
+def collect_music(args):
+    import http_client
+    import music_stats
+
+    if not args.api_key:
+        sys.exit("collect-music needs --api-key or LASTFM_API_KEY.")
+    users = args.users or music_stats.get_usernames_from_db(args.db)
+    if not users:
+        sys.exit(f"No usernames found in profiles table ({args.db}).")
+    for result in music_stats.music_stats_many(users, args.api_key, period=args.period, db_path=args.db,
+                                               workers=args.workers, incremental=not args.full):
+        print(result)
+    http_client.print_stats()
+
+
+def collect_itunes(args):
+    import http_client
+    import itunes_stats
+
+    result = itunes_stats.itunes_stats({}, args.db, budget=args.budget or None, workers=args.workers)
+    print(f"Tracks processed: {result['tracks_processed']}")
+    print(f"Tracks found: {result['tracks_found']}")
+    print(f"Tracks not found: {result['tracks_not_found']}")
+    if args.refresh:
+        print(f"Tracks refreshed: {itunes_stats.refresh_itunes_tracks(args.db, workers=args.workers)}")
+    http_client.print_stats()
+
+
+def collect_weather(args):
+    import http_client
+    import weather_stats
+
+    if args.backfill:
+        totals = weather_stats.backfill_weather(*args.backfill, cities=args.cities, chunk_days=args.chunk_days,
+                                                workers=args.workers, db_name=args.db, grid=not args.no_grid)
+        for city, rows in totals.items():
+            print(f"{city}: {rows} new rows")
+    else:
+        if not args.cities or len(args.cities) != 1 or not args.range:
+            sys.exit("collect-weather needs --backfill START END, or --cities CITY with --range START END.")
+        conn, cur = weather_stats.init_db(args.db)
+        city = args.cities[0]
+        data, lat, lon = weather_stats.weather_stats(city, *args.range, cur)
+        if data:
+            city_id = weather_stats.get_or_create_city(cur, conn, city, lat, lon)
+            weather_stats.store_daily_weather(cur, conn, city_id, data, row_limit=args.limit or None)
+        conn.close()
+    http_client.print_stats()
+
+
+def music_report(args):
+    import find_music_avg
+
+    if args.all:
+        summary = find_music_avg.build_all_reports(args.period, args.db, out_dir=args.out_dir,
+                                                   workers=args.workers, force=args.force)
+        print(f"Rendered {len(summary['rendered'])} users, skipped {len(summary['skipped'])} unchanged.")
+        return
+    if not args.username:
+        sys.exit("music-report needs a username or --all.")
+
+    out_json = os.path.join(args.out_dir, find_music_avg.report_filename("music_avg", args.username,
+                                                                         args.period, "json"))
+    stats = find_music_avg.find_music_average(args.username, args.period, args.db, out_json)
+    print("Wrote JSON:", out_json)
+    if args.charts:
+        print("Saved charts:", find_music_avg.make_visualizations(args.username, args.period, report=stats))
+
+
+def itunes_report(args):
+    import find_itunes_avg
+
+    find_itunes_avg.find_itunes_avg({}, args.db)
+    if args.charts:
+        find_itunes_avg.itunes_chart(args.db)
+
+
+def weather_report(args):
+    import find_weather_avg
+
+    find_weather_avg.find_weather_avg(args.city, args.start_date, args.end_date, args.db, charts=args.charts)
+
+
+def check_plans(args):
+    import check_query_plans
+
+    failures = check_query_plans.check_query_plans(args.db, args.verbose)
+    if failures:
+        sys.exit(f"{len(failures)} report queries scan a full table.")
+    print("All report queries use indexes.")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Music and weather stats.")
+    parser.add_argument("--db", default="data.db", help="database file (default: data.db)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("collect-music", help="fetch Last.fm top tracks and scrobbles")
+    p.add_argument("--api-key", default=os.environ.get("LASTFM_API_KEY"))
+    p.add_argument("--users", nargs="+", help="usernames (default: every profile)")
+    p.add_argument("--period", default="7day")
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--full", action="store_true", help="ignore sync state and fetch from the first page")
+    p.set_defaults(func=collect_music)
+
+    p = sub.add_parser("collect-itunes", help="enrich tracks with iTunes metadata")
+    p.add_argument("--budget", type=int, default=25, help="tracks to search (0 = whole backlog)")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--refresh", action="store_true", help="refresh known tracks via the lookup endpoint")
+    p.set_defaults(func=collect_itunes)
+
+    p = sub.add_parser("collect-weather", help="fetch daily weather from Open-Meteo")
+    p.add_argument("--backfill", nargs=2, metavar=("START", "END"))
+    p.add_argument("--range", nargs=2, metavar=("START", "END"), help="single-city date range")
+    p.add_argument("--cities", nargs="+")
+    p.add_argument("--limit", type=int, default=25, help="rows stored for a single city (0 = no limit)")
+    p.add_argument("--chunk-days", type=int, default=366)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--no-grid", action="store_true",
+                   help="backfill each city at its own coordinates instead of per grid cell")
+    p.set_defaults(func=collect_weather)
+
+    p = sub.add_parser("music-report", help="Last.fm averages, top artists and tracks")
+    p.add_argument("username", nargs="?")
+    p.add_argument("--all", action="store_true", help="every user, charts rendered in a process pool")
+    p.add_argument("--period", default="7day")
+    p.add_argument("--out-dir", default=".")
+    p.add_argument("--charts", action="store_true", help="also draw charts for a single user")
+    p.add_argument("--workers", type=int)
+    p.add_argument("--force", action="store_true")
+    p.set_defaults(func=music_report)
+
+    p = sub.add_parser("itunes-report", help="iTunes averages and genre stats")
+    p.add_argument("--charts", action="store_true")
+    p.set_defaults(func=itunes_report)
+
+    p = sub.add_parser("weather-report", help="weather averages for a city and date range")
+    p.add_argument("city")
+    p.add_argument("start_date")
+    p.add_argument("end_date")
+    p.add_argument("--charts", action="store_true")
+    p.set_defaults(func=weather_report)
+
+    p = sub.add_parser("check-plans", help="fail if a report query scans a full table")
+    p.add_argument("-v", "--verbose", action="store_true")
+    p.set_defaults(func=check_plans)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# db.py
+import os
+import queue
+import sqlite3
+import threading
+from urllib.parse import quote
+
+DB_PATH = "data.db"
+READ_POOL_SIZE = 4      # idle read-only connections kept per database
+BUSY_TIMEOUT = 30       # seconds a connection waits on a lock before failing
+
+# applied to every connection; the writer also switches the file to WAL
+CONNECTION_PRAGMAS = (
+    ("cache_size", -64 * 1024),       # 64 MiB page cache
+    ("mmap_size", 256 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+)
+WRITER_PRAGMAS = (
+    ("journal_mode", "WAL"),          # readers no longer block the writer, or each other
+    ("synchronous", "NORMAL"),        # safe under WAL; fsync only at checkpoints
+)
+
+_schemas = []        # schema functions taking a cursor, run once per database
+_initialized = set() # (path, schema function) pairs already run in this process
+_writers = {}        # path -> shared writer connection
+_readers = {}        # path -> queue of idle read-only connections
+_lock = threading.Lock()
+_pid = os.getpid()
+_inherited = []      # a forked child's copies of the parent's connections, kept so they are never closed
+
+
+class WriterConnection(sqlite3.Connection):
+    """
+    The single writer connection for a database, shared by every thread.
+    writer() hands it out under a re-entrant lock and counts how deep the
+    holding thread has nested; close() releases one level instead of closing
+    the connection, and only the outermost close() rolls back anything
+    uncommitted, so a helper's writer()/close() never discards its caller's work.
+    """
+
+    def close(self):
+        self.depth -= 1
+        try:
+            if self.depth == 0 and self.in_transaction:
+                self.rollback()
+        finally:
+            self.write_lock.release()
+
+
+class ReaderConnection(sqlite3.Connection):
+    """A read-only connection; close() returns it to the pool."""
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+        pool = _readers.get(self.path)
+        try:
+            if pool is None:
+                raise queue.Full
+            pool.put_nowait(self)
+        except queue.Full:
+            super().close()
+
+
+def register_schema(schema):
+    """Adds a schema function (cursor -> None) to run once per database and process."""
+    if schema not in _schemas:
+        _schemas.append(schema)
+
+
+def table_columns(cur, table):
+    """{column name: declared type} for a table ({} when it does not exist)."""
+    cur.execute(f"PRAGMA table_info({table})")
+    return {row[1]: row[2] for row in cur.fetchall()}
+
+
+def rebuild_table(cur, table, create_sql, fill):
+    """
+    Moves a table to a new layout in one savepoint, in the order SQLite
+    recommends: create_sql (formatted with name=) makes "<table>_new",
+    fill(cur, new_name) copies the rows, then the old table is dropped and the
+    new one renamed. The old indexes go with it; the caller recreates them.
+    """
+    new = f"{table}_new"
+    cur.execute(f"SAVEPOINT rebuild_{table}")
+    try:
+        cur.execute(create_sql.format(name=new))
+        fill(cur, new)
+        cur.execute(f"DROP TABLE {table}")
+        cur.execute(f"ALTER TABLE {new} RENAME TO {table}")
+    except BaseException:
+        cur.execute(f"ROLLBACK TO rebuild_{table}")
+        cur.execute(f"RELEASE rebuild_{table}")
+        raise
+    cur.execute(f"RELEASE rebuild_{table}")
+
+
+def apply_pragmas(conn, pragmas):
+    for name, value in pragmas:
+        conn.execute(f"PRAGMA {name}={value}")
+
+
+def _check_fork():
+    # connections must not cross a fork; a child process starts with its own
+    global _pid
+    if os.getpid() != _pid:
+        _pid = os.getpid()
+        _inherited.append((dict(_writers), dict(_readers)))
+        _initialized.clear()
+        _writers.clear()
+        _readers.clear()
+
+
+def _get_writer(path):
+    with _lock:
+        _check_fork()
+        conn = _writers.get(path)
+        if conn is None:
+            conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                                   factory=WriterConnection)
+            conn.path = path
+            conn.write_lock = threading.RLock()
+            conn.depth = 0   # writer() calls the holding thread has not closed yet
+            apply_pragmas(conn, WRITER_PRAGMAS + CONNECTION_PRAGMAS)
+            _writers[path] = conn
+            _readers[path] = queue.LifoQueue(maxsize=READ_POOL_SIZE)
+    return conn
+
+
+def _init_schema(conn, path):
+    pending = [s for s in _schemas if (path, s) not in _initialized]
+    if not pending:
+        return
+    cur = conn.cursor()
+    for schema in pending:
+        schema(cur)
+        conn.commit()
+        _initialized.add((path, schema))
+
+
+def writer(path=DB_PATH):
+    """
+    The database's writer connection, with the schema initialized. Blocks while
+    another thread holds it; call close() when done to let the next writer in.
+    """
+    path = os.path.abspath(path)
+    conn = _get_writer(path)
+    conn.write_lock.acquire()
+    conn.depth += 1
+    try:
+        # a nested call leaves the schema alone: its commits would commit the caller's work
+        if conn.depth == 1:
+            _init_schema(conn, path)
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+
+def reader(path=DB_PATH):
+    """
+    A pooled read-only connection. Under WAL it sees the last committed state
+    and runs alongside the writer. close() returns it to the pool.
+    """
+    path = os.path.abspath(path)
+    with _lock:
+        _check_fork()
+    if path not in _writers or any((path, s) not in _initialized for s in _schemas):
+        writer(path).close()   # creates the file, switches it to WAL and runs the schema once
+    try:
+        return _readers[path].get_nowait()
+    except queue.Empty:
+        pass
+
+    conn = sqlite3.connect(f"file:{quote(path)}?mode=ro", uri=True, timeout=BUSY_TIMEOUT,
+                           check_same_thread=False, factory=ReaderConnection)
+    conn.path = path
+    apply_pragmas(conn, CONNECTION_PRAGMAS)
+    return conn
+
+
+def close_all():
+    """Really closes every pooled and writer connection (e.g. before deleting the file)."""
+    with _lock:
+        for pool in _readers.values():
+            while not pool.empty():
+                sqlite3.Connection.close(pool.get_nowait())
+        for conn in _writers.values():
+            with conn.write_lock:
+                sqlite3.Connection.close(conn)
+        _writers.clear()
+        _readers.clear()
+        _initialized.clear()
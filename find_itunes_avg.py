@@ -1,41 +1,49 @@
-import sqlite3
-import seaborn as sns
-import matplotlib.pyplot as plt
-import pandas as pd
+import db
+import itunes_stats  # registers the iTunes schema, which db.reader() sets up if needed
+
+# report queries; check_query_plans.py runs EXPLAIN QUERY PLAN on each of them
+SUMMARY_AVG_SQL = '''
+    SELECT length_sum / length_count / 60000.0 AS avg_track_length_minutes,
+           price_sum / price_count AS avg_track_price,
+           year_sum / year_count AS avg_release_year
+    FROM itunes_summary
+    WHERE scope = 'all'
+'''
+
+GENRE_STATS_SQL = '''
+    SELECT g.genre_name, s.track_count,
+           s.length_sum / s.length_count / 60000.0 AS avg_length_minutes
+    FROM itunes_summary s
+    JOIN genres g ON g.id = s.key
+    WHERE s.scope = 'genre' AND s.track_count > 0
+    ORDER BY s.track_count DESC
+'''
+
+GENRE_CHART_SQL = '''
+    SELECT g.genre_name, s.track_count
+    FROM itunes_summary s
+    JOIN genres g ON g.id = s.key
+    WHERE s.scope = 'genre' AND s.track_count > 0
+    ORDER BY s.track_count DESC
+    LIMIT 10
+'''
+
+YEAR_CHART_SQL = '''
+    SELECT key AS release_year, track_count
+    FROM itunes_summary
+    WHERE scope = 'year' AND track_count > 0
+    ORDER BY key
+'''
 
 def find_itunes_avg(music_stats_dict, db_name='data.db'):
-    conn = sqlite3.connect(db_name)
+    conn = db.reader(db_name)
     cur = conn.cursor()
     
-    cur.execute('''
-        SELECT AVG(track_time_millis) / 60000.0 AS avg_track_length_minutes
-        FROM itunes_tracks
-        WHERE track_time_millis IS NOT NULL
-    ''')
-    avg_length = cur.fetchone()[0]
+    # all averages come from the precomputed itunes_summary rows, not from itunes_tracks
+    cur.execute(SUMMARY_AVG_SQL)
+    avg_length, avg_price, avg_year = cur.fetchone() or (None, None, None)
     
-    cur.execute('''
-        SELECT AVG(track_price) AS avg_track_price
-        FROM itunes_tracks
-        WHERE track_price IS NOT NULL
-    ''')
-    avg_price = cur.fetchone()[0]
-    
-    cur.execute('''
-        SELECT AVG(release_year) AS avg_release_year
-        FROM itunes_tracks
-        WHERE release_year IS NOT NULL
-    ''')
-    avg_year = cur.fetchone()[0]
-    
-    cur.execute('''
-        SELECT g.genre_name, COUNT(*) as track_count, 
-               AVG(i.track_time_millis) / 60000.0 as avg_length_minutes
-        FROM itunes_tracks i
-        JOIN genres g ON i.genre_id = g.id
-        GROUP BY g.genre_name
-        ORDER BY track_count DESC
-    ''')
+    cur.execute(GENRE_STATS_SQL)
     genre_stats = cur.fetchall()
     
     conn.close()
@@ -69,26 +77,14 @@ def find_itunes_avg(music_stats_dict, db_name='data.db'):
     return results
 
 def itunes_chart(db_name='data.db'):
-    conn = sqlite3.connect(db_name)
-    
-    query = '''
-        SELECT g.genre_name, COUNT(*) as track_count
-        FROM itunes_tracks i
-        JOIN genres g ON i.genre_id = g.id
-        GROUP BY g.genre_name
-        ORDER BY track_count DESC
-        LIMIT 10
-    '''
-    genre_df = pd.read_sql_query(query, conn)
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn as sns
+
+    conn = db.reader(db_name)
     
-    year_query = '''
-        SELECT release_year, COUNT(*) as track_count
-        FROM itunes_tracks
-        WHERE release_year IS NOT NULL
-        GROUP BY release_year
-        ORDER BY release_year
-    '''
-    year_df = pd.read_sql_query(year_query, conn)
+    genre_df = pd.read_sql_query(GENRE_CHART_SQL, conn)
+    year_df = pd.read_sql_query(YEAR_CHART_SQL, conn)
     
     conn.close()
     
@@ -1,147 +1,282 @@
 # find_music_avg.py
-import sqlite3
+import argparse
 import json
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import groupby
+from operator import itemgetter
+
+import db
+import music_stats  # noqa: F401  (registers the music schema, which db.reader() sets up if needed)
 
 DB_PATH = "data.db"
 
+TOP_N = 10
 
-def find_music_average(username, period="7day", db_path=DB_PATH, out_json=None):
+# report queries; check_query_plans.py runs EXPLAIN QUERY PLAN on each of them
+USER_ID_SQL = "SELECT id FROM users WHERE username=?"
+
+# JOIN: one user's whole period slice, already in chart order (read off the covering index)
+REPORT_SLICE_SQL = """
+    SELECT ltt.track_id, t.name, a.id, a.name, ltt.playcount
+    FROM lastfm_toptracks ltt
+    JOIN tracks t ON ltt.track_id = t.id
+    JOIN artists a ON t.artist_id = a.id
+    WHERE ltt.user_id=? AND ltt.period=(SELECT code FROM lastfm_periods WHERE name=?)
+    ORDER BY ltt.playcount DESC, ltt.track_id;
+"""
+
+# JOIN: every user's slice in one pass over the index, grouped by user_id;
+# each slice is put in chart order in Python
+ALL_USERS_SLICE_SQL = """
+    SELECT u.username, ltt.track_id, t.name, a.id, a.name, ltt.playcount
+    FROM lastfm_toptracks ltt
+    JOIN users u ON ltt.user_id = u.id
+    JOIN tracks t ON ltt.track_id = t.id
+    JOIN artists a ON t.artist_id = a.id
+    WHERE ltt.period=(SELECT code FROM lastfm_periods WHERE name=?)
+    ORDER BY ltt.user_id;
+"""
+
+
+def summarize_slice(username, period, rows):
     """
-    PART 2 FUNCTION (required name): find_music_average()
-    Uses JOINs, writes JSON, returns dict.
+    Builds the report dict from (track_id, track, artist_id, artist, playcount)
+    rows sorted by playcount: average, row count, top artists and top tracks,
+    all from the one slice.
     """
-    conn = sqlite3.connect(db_path)
+    num_rows = len(rows)
+    total = sum(r[4] for r in rows)
+
+    artist_totals = {}
+    for _, _, artist_id, artist, playcount in rows:
+        if artist_id in artist_totals:
+            artist_totals[artist_id][1] += playcount
+        else:
+            artist_totals[artist_id] = [artist, playcount]
+    top_artists = sorted(artist_totals.items(), key=lambda item: (-item[1][1], item[0]))[:TOP_N]
+
+    return {
+        "username": username,
+        "period": period,
+        "num_toptracks_rows_for_period": num_rows,
+        "avg_playcount_toptracks_for_period": round(total / num_rows, 2) if num_rows else 0.0,
+        "top_artists_by_total_playcount": [
+            {"artist": artist, "total_playcount": int(playcount)} for _, (artist, playcount) in top_artists
+        ],
+        "top_tracks_by_playcount": [
+            {"track": track, "artist": artist, "playcount": int(playcount)}
+            for _, track, _, artist, playcount in rows[:TOP_N]
+        ]
+    }
+
+
+def load_report(username, period="7day", db_path=DB_PATH):
+    conn = db.reader(db_path)
     cur = conn.cursor()
 
-    cur.execute("SELECT id FROM users WHERE username=?", (username,))
+    cur.execute(USER_ID_SQL, (username,))
     row = cur.fetchone()
     if not row:
         conn.close()
         raise ValueError(f"User '{username}' not found in users table. Run music_stats() first.")
-    user_id = row[0]
-
-    # JOIN: avg playcount + count of stored toptracks for that period
-    cur.execute("""
-        SELECT AVG(ltt.playcount), COUNT(*)
-        FROM lastfm_toptracks ltt
-        JOIN tracks t ON ltt.track_id = t.id
-        JOIN artists a ON t.artist_id = a.id
-        WHERE ltt.user_id=? AND ltt.period=?;
-    """, (user_id, period))
-    avg_playcount, num_rows = cur.fetchone()
-    avg_playcount = float(avg_playcount) if avg_playcount is not None else 0.0
-    num_rows = int(num_rows) if num_rows is not None else 0
-
-    # JOIN: top artists
-    cur.execute("""
-        SELECT a.name, SUM(ltt.playcount) AS total_playcount
-        FROM lastfm_toptracks ltt
-        JOIN tracks t ON ltt.track_id = t.id
-        JOIN artists a ON t.artist_id = a.id
-        WHERE ltt.user_id=? AND ltt.period=?
-        GROUP BY a.id
-        ORDER BY total_playcount DESC
-        LIMIT 10;
-    """, (user_id, period))
-    top_artists = [{"artist": r[0], "total_playcount": int(r[1])} for r in cur.fetchall()]
-
-    # JOIN: top tracks
-    cur.execute("""
-        SELECT t.name, a.name, ltt.playcount
-        FROM lastfm_toptracks ltt
-        JOIN tracks t ON ltt.track_id = t.id
-        JOIN artists a ON t.artist_id = a.id
-        WHERE ltt.user_id=? AND ltt.period=?
-        ORDER BY ltt.playcount DESC
-        LIMIT 10;
-    """, (user_id, period))
-    top_tracks = [{"track": r[0], "artist": r[1], "playcount": int(r[2])} for r in cur.fetchall()]
 
+    cur.execute(REPORT_SLICE_SQL, (row[0], period))
+    rows = cur.fetchall()
     conn.close()
+    return summarize_slice(username, period, rows)
 
-    result = {
-        "username": username,
-        "period": period,
-        "num_toptracks_rows_for_period": num_rows,
-        "avg_playcount_toptracks_for_period": round(avg_playcount, 2),
-        "top_artists_by_total_playcount": top_artists,
-        "top_tracks_by_playcount": top_tracks
-    }
 
+def report_filename(prefix, username, period, ext):
+    return f"{prefix}_{username}_{period}.{ext}".replace("/", "_").replace("\\", "_")
+
+
+def write_report_json(result, out_json=None):
     if out_json is None:
-        out_json = f"music_avg_{username}_{period}.json".replace("/", "_").replace("\\", "_")
+        out_json = report_filename("music_avg", result["username"], result["period"], "json")
 
     with open(out_json, "w", encoding="utf-8") as f:
         json.dump(result, f, indent=2)
+    return out_json
+
 
+def find_music_average(username, period="7day", db_path=DB_PATH, out_json=None):
+    """
+    PART 2 FUNCTION (required name): find_music_average()
+    Uses JOINs, writes JSON, returns dict.
+    """
+    result = load_report(username, period, db_path)
+    write_report_json(result, out_json)
     return result
 
 
-def make_visualizations(username, period="7day", db_path=DB_PATH):
+def iter_all_reports(period="7day", db_path=DB_PATH):
+    """Yields the report of every user with toptracks in the period, from a single query."""
+    conn = db.reader(db_path)
+    cur = conn.cursor()
+    try:
+        cur.execute(ALL_USERS_SLICE_SQL, (period,))
+        for username, rows in groupby(cur, key=itemgetter(0)):
+            rows = sorted((r[1:] for r in rows), key=lambda r: (-r[4], r[0]))
+            yield summarize_slice(username, period, rows)
+    finally:
+        conn.close()
+
+
+def find_all_music_averages(period="7day", db_path=DB_PATH, out_dir="."):
+    """
+    Batch mode: reports for every user with toptracks in the period, from a
+    single query. Writes one JSON per user into out_dir and returns
+    {username: report}.
+    """
+    reports = {}
+    for result in iter_all_reports(period, db_path):
+        username = result["username"]
+        write_report_json(result, os.path.join(out_dir, report_filename("music_avg", username, period, "json")))
+        reports[username] = result
+    return reports
+
+
+# pandas/seaborn/matplotlib are imported by the chart functions only, so
+# JSON-only runs never load the plotting stack
+
+def plot_top_tracks(ax, report):
+    import pandas as pd
+    import seaborn as sns
+
+    tracks_df = pd.DataFrame(report["top_tracks_by_playcount"], columns=["track", "artist", "playcount"])
+    sns.barplot(data=tracks_df, x="playcount", y="track", ax=ax)
+    ax.set_title(f"Top 10 Tracks — {report['username']} ({report['period']})")
+    ax.set_xlabel("Playcount")
+    ax.set_ylabel("Track")
+
+
+def plot_top_artists(ax, report):
+    import pandas as pd
+    import seaborn as sns
+
+    artists_df = pd.DataFrame(report["top_artists_by_total_playcount"], columns=["artist", "total_playcount"])
+    sns.barplot(data=artists_df, x="total_playcount", y="artist", ax=ax)
+    ax.set_title(f"Top 10 Artists — {report['username']} ({report['period']})")
+    ax.set_xlabel("Total Playcount")
+    ax.set_ylabel("Artist")
+
+
+CHARTS = (("chart_tracks", "tracks_chart", plot_top_tracks), ("chart_artists", "artists_chart", plot_top_artists))
+
+
+def make_visualizations(username, period="7day", db_path=DB_PATH, report=None):
     """
     Creates 2 charts and saves PNGs.
+    Pass the dict from find_music_average() as report to chart it without
+    touching the database again.
     """
-    conn = sqlite3.connect(db_path)
-
-    tracks_df = pd.read_sql_query("""
-        SELECT t.name AS track, a.name AS artist, ltt.playcount AS playcount
-        FROM lastfm_toptracks ltt
-        JOIN users u ON ltt.user_id = u.id
-        JOIN tracks t ON ltt.track_id = t.id
-        JOIN artists a ON t.artist_id = a.id
-        WHERE u.username=? AND ltt.period=?
-        ORDER BY ltt.playcount DESC
-        LIMIT 10;
-    """, conn, params=(username, period))
-
-    artists_df = pd.read_sql_query("""
-        SELECT a.name AS artist, SUM(ltt.playcount) AS total_playcount
-        FROM lastfm_toptracks ltt
-        JOIN users u ON ltt.user_id = u.id
-        JOIN tracks t ON ltt.track_id = t.id
-        JOIN artists a ON t.artist_id = a.id
-        WHERE u.username=? AND ltt.period=?
-        GROUP BY a.id
-        ORDER BY total_playcount DESC
-        LIMIT 10;
-    """, conn, params=(username, period))
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-    conn.close()
+    if report is None:
+        report = load_report(username, period, db_path)
 
     sns.set(style="whitegrid")
 
-    plt.figure(figsize=(10, 5))
-    sns.barplot(data=tracks_df, x="playcount", y="track")
-    plt.title(f"Top 10 Tracks — {username} ({period})")
-    plt.xlabel("Playcount")
-    plt.ylabel("Track")
-    plt.tight_layout()
-    out1 = f"chart_tracks_{username}_{period}.png".replace("/", "_").replace("\\", "_")
-    plt.savefig(out1, dpi=200)
-    plt.show()
-
-    plt.figure(figsize=(10, 5))
-    sns.barplot(data=artists_df, x="total_playcount", y="artist")
-    plt.title(f"Top 10 Artists — {username} ({period})")
-    plt.xlabel("Total Playcount")
-    plt.ylabel("Artist")
-    plt.tight_layout()
-    out2 = f"chart_artists_{username}_{period}.png".replace("/", "_").replace("\\", "_")
-    plt.savefig(out2, dpi=200)
-    plt.show()
-
-    return {"tracks_chart": out1, "artists_chart": out2}
+    charts = {}
+    for prefix, key, plot in CHARTS:
+        plt.figure(figsize=(10, 5))
+        plot(plt.gca(), report)
+        plt.tight_layout()
+        charts[key] = report_filename(prefix, username, period, "png")
+        plt.savefig(charts[key], dpi=200)
+        plt.show()
+
+    return charts
+
+
+# ---- headless batch rendering ----
+
+_figure = None   # one figure per worker process, cleared and reused for every chart
+
+
+def init_chart_worker():
+    global _figure
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.switch_backend("Agg")
+    sns.set(style="whitegrid")
+    _figure = plt.figure(figsize=(10, 5))
+
+
+def render_charts(report, out_dir="."):
+    """Draws the report's charts on this worker's figure and saves the PNGs."""
+    charts = {}
+    for prefix, key, plot in CHARTS:
+        _figure.clf()
+        plot(_figure.add_subplot(), report)
+        _figure.tight_layout()
+        charts[key] = os.path.join(out_dir, report_filename(prefix, report["username"], report["period"], "png"))
+        _figure.savefig(charts[key], dpi=200)
+    return charts
+
+
+def report_unchanged(result, out_json, out_dir):
+    """True if out_json already holds this report and its charts were rendered."""
+    for prefix, _, _ in CHARTS:
+        if not os.path.exists(os.path.join(out_dir, report_filename(prefix, result["username"], result["period"], "png"))):
+            return False
+    try:
+        with open(out_json, encoding="utf-8") as f:
+            return json.load(f) == result
+    except (OSError, ValueError):
+        return False
+
+
+def build_all_reports(period="7day", db_path=DB_PATH, out_dir=".", workers=None, force=False):
+    """
+    Headless batch: JSON for every user, charts rendered across a process pool
+    with the Agg backend. Users whose report matches the JSON on disk (and whose
+    charts exist) are skipped unless force is set. Returns {"rendered": [...],
+    "skipped": [...]} usernames.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rendered, skipped = [], []
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_chart_worker) as pool:
+        futures = {}
+        for result in iter_all_reports(period, db_path):
+            username = result["username"]
+            out_json = os.path.join(out_dir, report_filename("music_avg", username, period, "json"))
+            if not force and report_unchanged(result, out_json, out_dir):
+                skipped.append(username)
+                continue
+            write_report_json(result, out_json)
+            futures[pool.submit(render_charts, result, out_dir)] = username
+
+        for future in as_completed(futures):
+            future.result()
+            rendered.append(futures[future])
+
+    return {"rendered": rendered, "skipped": skipped}
 
 
 if __name__ == "__main__":
-    user = input("Username: ").strip()
-    period = input("Period (7day, 1month, 3month, etc.): ").strip() or "7day"
+    parser = argparse.ArgumentParser(description="Last.fm listening reports.")
+    parser.add_argument("--all", action="store_true", help="build reports for every user without prompting")
+    parser.add_argument("--period", default="7day")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--out-dir", default=".")
+    parser.add_argument("--workers", type=int, help="chart rendering processes (default: one per core)")
+    parser.add_argument("--force", action="store_true", help="re-render users whose data has not changed")
+    args = parser.parse_args()
+
+    if args.all:
+        summary = build_all_reports(args.period, args.db, out_dir=args.out_dir, workers=args.workers, force=args.force)
+        print(f"Rendered {len(summary['rendered'])} users, skipped {len(summary['skipped'])} unchanged.")
+    else:
+        user = input("Username: ").strip()
+        period = input("Period (7day, 1month, 3month, etc.): ").strip() or "7day"
 
-    stats = find_music_average(user, period)
-    print(" Wrote JSON:", f"music_avg_{user}_{period}.json")
+        stats = find_music_average(user, period, args.db)
+        print(" Wrote JSON:", f"music_avg_{user}_{period}.json")
 
-    charts = make_visualizations(user, period)
-    print("Saved charts:", charts)
\ No newline at end of file
+        charts = make_visualizations(user, period, report=stats)
+        print("Saved charts:", charts)
@@ -1,16 +1,98 @@
-import sqlite3
-import seaborn as sns
-import matplotlib.pyplot as plt
-import pandas as pd
+from datetime import date, timedelta
 
-def find_weather_avg(city: str, start_date: str, end_date: str):
-    conn = sqlite3.connect("data.db")
+import db
+from weather_stats import CUM_COLUMNS, WEATHER_COLUMNS  # also registers the weather schema, rollups included
+
+# report queries; check_query_plans.py runs EXPLAIN QUERY PLAN on each of them
+CITY_ID_SQL = "SELECT id FROM cities WHERE name = ?"
+
+# the plain average over daily rows; weather_averages() answers the same from the
+# monthly rollups and only runs this for dates that are not YYYY-MM-DD
+WEATHER_AVG_SQL = """
+    SELECT
+        AVG(max_temp_f),
+        AVG(min_temp_f),
+        AVG(rain),
+        AVG(snow)
+    FROM daily_weather
+    WHERE city_id = ?
+      AND date BETWEEN ? AND ?
+"""
+
+# running totals through the last month stored at or before a month ("YYYY-MM")
+ROLLUP_CUM_SQL = f"""
+    SELECT {", ".join(CUM_COLUMNS)}
+    FROM weather_monthly
+    WHERE city_id = ? AND month <= ?
+    ORDER BY month DESC
+    LIMIT 1
+"""
+
+# totals and non-NULL counts over the days of a partial month
+WEATHER_PARTIAL_SQL = f"""
+    SELECT {", ".join(f"TOTAL({c}), COUNT({c})" for c in WEATHER_COLUMNS)}
+    FROM daily_weather
+    WHERE city_id = ?
+      AND date BETWEEN ? AND ?
+"""
+
+WEATHER_DAYS_SQL = """
+    SELECT date, max_temp_f, min_temp_f, rain, snow
+    FROM daily_weather
+    WHERE city_id = ?
+      AND date BETWEEN ? AND ?
+    ORDER BY date
+"""
+
+# the whole months inside [start, end] as (first day, last day), or None
+def whole_months(start, end):
+    first = start if start.day == 1 else (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+    last = end if (end + timedelta(days=1)).day == 1 else end.replace(day=1) - timedelta(days=1)
+    if first > last:
+        return None
+    return first, last
+
+# AVG() of each weather column over [start_date, end_date], from at most two partial
+# months of daily rows plus two lookups of the monthly running totals. Gives the same
+# results as WEATHER_AVG_SQL (None for a column with no values), up to float rounding
+def weather_averages(cur, city_id, start_date, end_date):
+    try:
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    except ValueError:
+        # not plain YYYY-MM-DD; let SQLite compare the strings as before
+        cur.execute(WEATHER_AVG_SQL, (city_id, start_date, end_date))
+        return cur.fetchone()
+
+    totals = [0.0] * len(CUM_COLUMNS)
+    def add(values, sign=1):
+        for i, v in enumerate(values):
+            totals[i] += sign * v
+
+    months = whole_months(start, end) if start <= end else None
+    if months is None:
+        cur.execute(WEATHER_PARTIAL_SQL, (city_id, start_date, end_date))
+        add(cur.fetchone())
+    else:
+        first, last = months
+        if start < first:
+            cur.execute(WEATHER_PARTIAL_SQL, (city_id, start_date, (first - timedelta(days=1)).isoformat()))
+            add(cur.fetchone())
+        if last < end:
+            cur.execute(WEATHER_PARTIAL_SQL, (city_id, (last + timedelta(days=1)).isoformat(), end_date))
+            add(cur.fetchone())
+
+        cur.execute(ROLLUP_CUM_SQL, (city_id, last.isoformat()[:7]))
+        add(cur.fetchone() or ())
+        cur.execute(ROLLUP_CUM_SQL, (city_id, (first - timedelta(days=1)).isoformat()[:7]))
+        add(cur.fetchone() or (), sign=-1)
+
+    return tuple(total / count if count else None for total, count in zip(totals[::2], totals[1::2]))
+
+def find_weather_avg(city: str, start_date: str, end_date: str, db_name="data.db", charts=True):
+    conn = db.reader(db_name)
     # gets city ID from data.db
     cur = conn.cursor()
-    cur.execute(
-        "SELECT id FROM cities WHERE name = ?",
-        (city,)
-    )
+    cur.execute(CITY_ID_SQL, (city,))
     result = cur.fetchone()
 
     if not result:
@@ -21,17 +103,7 @@ def find_weather_avg(city: str, start_date: str, end_date: str):
     city_id = result[0]
 
     # calculates averages from weather.db
-    cur.execute("""
-        SELECT
-            AVG(max_temp_f),
-            AVG(min_temp_f),
-            AVG(rain),
-            AVG(snow)
-        FROM daily_weather
-        WHERE city_id = ?
-          AND date BETWEEN ? AND ?
-    """, (city_id, start_date, end_date))
-    avg_max, avg_min, avg_rain, avg_snow = cur.fetchone()
+    avg_max, avg_min, avg_rain, avg_snow = weather_averages(cur, city_id, start_date, end_date)
     if avg_max is None:
         print("No weather records found for that date range.")
         conn.close()
@@ -52,17 +124,18 @@ def find_weather_avg(city: str, start_date: str, end_date: str):
         f.write(f"Average Snowfall: {avg_snow:.2f} cm/day\n")
     print(f"Averages written to {city}_weather_summary.txt")
 
-    # loads data for visualizations
-    df = pd.read_sql_query("""
-        SELECT date, max_temp_f, min_temp_f, rain, snow
-        FROM daily_weather
-        WHERE city_id = ?
-          AND date BETWEEN ? AND ?
-        ORDER BY date
-    """, conn, params=(city_id, start_date, end_date))
-
+    if charts:
+        weather_charts(conn, city, city_id, start_date, end_date, avg_rain, avg_snow)
     conn.close()
 
+def weather_charts(conn, city, city_id, start_date, end_date, avg_rain, avg_snow):
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn as sns
+
+    # loads data for visualizations
+    df = pd.read_sql_query(WEATHER_DAYS_SQL, conn, params=(city_id, start_date, end_date))
+
     sns.set(style="whitegrid")
 
     # temps over time chart
@@ -0,0 +1,56 @@
+# gazetteer.py
+# Offline city lookup for the weather collector. gazetteer.csv (name, state,
+# latitude, longitude) is loaded once into parallel arrays sorted by name and
+# searched with bisect, so listed cities never go to the geocoding API.
+import csv
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.csv")
+
+_default = None
+
+
+def normalize(name):
+    return " ".join(name.split()).casefold()
+
+
+class Gazetteer:
+    """City names sorted for bisect lookups, with states and coordinates alongside."""
+
+    def __init__(self, rows):
+        # sorted() is stable, so among cities of the same name the first listed wins
+        rows = sorted(((normalize(name), state.strip().upper(), float(lat), float(lon))
+                       for name, state, lat, lon in rows), key=lambda r: r[0])
+        self.names = [r[0] for r in rows]
+        self.states = [r[1] for r in rows]
+        self.latitudes = array("d", (r[2] for r in rows))
+        self.longitudes = array("d", (r[3] for r in rows))
+
+    @classmethod
+    def load(cls, path=GAZETTEER_PATH):
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls((r["name"], r["state"], r["latitude"], r["longitude"]) for r in csv.DictReader(f))
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, name, state=None):
+        """(latitude, longitude) for "Ann Arbor" or "Ann Arbor, MI", or None if it is not listed."""
+        if state is None and "," in name:
+            name, state = name.rsplit(",", 1)
+        key = normalize(name)
+        start = bisect_left(self.names, key)
+        for i in range(start, bisect_right(self.names, key, start)):
+            if state is None or self.states[i] == state.strip().upper():
+                return self.latitudes[i], self.longitudes[i]
+        return None
+
+
+def lookup(name, state=None):
+    """Gazetteer.lookup() on gazetteer.csv, loaded on first use (empty if the file is missing)."""
+    global _default
+    if _default is None:
+        _default = Gazetteer.load() if os.path.exists(GAZETTEER_PATH) else Gazetteer([])
+    return _default.lookup(name, state)
@@ -0,0 +1,267 @@
+# generate_data.py
+# Fills a fresh database with synthetic data in the full schema (music_stats,
+# itunes_stats and weather_stats tables) so reports can be tried at scale.
+#   python generate_data.py synthetic.db --scale 100
+# scale 1 is roughly 10k top-track rows; every table grows linearly with it.
+import argparse
+import math
+import os
+import sqlite3
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+import itunes_stats
+import music_stats
+import weather_stats
+
+PERIODS = ["7day", "1month", "3month", "6month", "12month", "overall"]
+TOPTRACKS_PER_PERIOD = 50    # one API page per user and period
+SCROBBLES_PER_USER = 100
+USERS_PER_CITY = 25
+TRACKS_PER_ARTIST = 5
+ARTISTS_PER_SCALE = 500
+WEATHER_YEARS = 10
+ZIPF_EXPONENT = 1.1          # artist popularity ~ 1 / rank ** ZIPF_EXPONENT
+ITUNES_MATCH_RATE = 0.7      # share of tracks with an itunes_tracks row
+ITUNES_NOT_FOUND_RATE = 0.1  # share of tracks marked not_found
+MISSING_WEATHER_RATE = 0.01  # share of weather values stored as NULL
+
+GENRES = [
+    "Alternative", "Pop", "Rock", "Hip-Hop/Rap", "Country", "R&B/Soul", "Electronic",
+    "Dance", "Indie Pop", "Singer/Songwriter", "Jazz", "Metal", "Folk", "Soundtrack",
+]
+
+# (name, state, latitude, longitude); more cities than listed get numbered names nearby
+CITIES = [
+    ("Ann Arbor", "MI", 42.27756, -83.74088),
+    ("Grand Rapids", "MI", 42.96336, -85.66809),
+    ("East Lansing", "MI", 42.73698, -84.48387),
+    ("Detroit", "MI", 42.33143, -83.04575),
+    ("Wyandotte", "MI", 42.21421, -83.14992),
+    ("Kalamazoo", "MI", 42.29171, -85.58723),
+    ("Denton", "TX", 33.21484, -97.13307),
+    ("Chicago", "IL", 41.85003, -87.65005),
+]
+
+SCHEMAS = (music_stats.init_db, weather_stats.create_weather_tables, itunes_stats.create_itunes_schema)
+
+PERIOD_PLAYS = {"7day": 40, "1month": 120, "3month": 300, "6month": 550, "12month": 1000, "overall": 4000}
+
+
+def scaled_counts(scale):
+    users = max(1, round(scale * 10_000 / (len(PERIODS) * TOPTRACKS_PER_PERIOD)))
+    artists = max(50, round(scale * ARTISTS_PER_SCALE))
+    return {
+        "users": users,
+        "cities": max(1, math.ceil(users / USERS_PER_CITY)),
+        "artists": artists,
+        "tracks": artists * TRACKS_PER_ARTIST,
+    }
+
+
+def zipf_cdf(n, exponent=ZIPF_EXPONENT):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def sample_tracks(rng, artist_cdf, k):
+    """k distinct track ids: a Zipf-weighted artist, then one of its tracks."""
+    picked = np.empty(0, dtype=np.int64)
+    while len(picked) < k:
+        artists = np.searchsorted(artist_cdf, rng.random(2 * k))
+        tracks = artists * TRACKS_PER_ARTIST + rng.integers(0, TRACKS_PER_ARTIST, 2 * k) + 1
+        tracks = np.concatenate([picked, tracks])
+        _, first = np.unique(tracks, return_index=True)
+        picked = tracks[np.sort(first)]
+    return picked[:k]
+
+
+def city_rows(n):
+    for i in range(n):
+        if i < len(CITIES):
+            yield CITIES[i]
+        else:
+            name, state, lat, lon = CITIES[i % len(CITIES)]
+            yield f"{name} {i // len(CITIES)}", state, lat + 0.1 * (i // len(CITIES)), lon
+
+
+def generate_music(cur, rng, counts):
+    n_users, n_artists, n_tracks = counts["users"], counts["artists"], counts["tracks"]
+    cities = list(city_rows(counts["cities"]))
+
+    usernames = [f"user_{i}" for i in range(1, n_users + 1)]
+    cur.executemany("INSERT INTO users (id, username) VALUES (?, ?)", enumerate(usernames, start=1))
+    cur.executemany(
+        "INSERT INTO profiles (id, username, city, state) VALUES (?, ?, ?, ?)",
+        ((i, name, *cities[(i - 1) % len(cities)][:2]) for i, name in enumerate(usernames, start=1))
+    )
+
+    # artist ids are popularity ranks; track ids are artist_id-major
+    cur.executemany("INSERT INTO artists (id, name) VALUES (?, ?)",
+                    ((i, f"Artist {i}") for i in range(1, n_artists + 1)))
+    cur.executemany(
+        "INSERT INTO tracks (id, name, artist_id) VALUES (?, ?, ?)",
+        ((t, f"Track {t}", (t - 1) // TRACKS_PER_ARTIST + 1) for t in range(1, n_tracks + 1))
+    )
+
+    artist_cdf = zipf_cdf(n_artists)
+    now = int(time.time())
+
+    def toptracks():
+        for user_id in range(1, n_users + 1):
+            activity = rng.lognormal(0, 0.75)
+            for period in PERIODS:
+                track_ids = sample_tracks(rng, artist_cdf, min(TOPTRACKS_PER_PERIOD, n_tracks))
+                # playcounts fall off with chart position
+                plays = PERIOD_PLAYS[period] * activity / np.arange(1, len(track_ids) + 1) ** 0.8
+                plays = np.maximum(1, plays.astype(int))
+                yield from zip([user_id] * len(track_ids), [music_stats.PERIOD_CODES[period]] * len(track_ids),
+                               track_ids.tolist(), plays.tolist())
+
+    cur.executemany(
+        "INSERT INTO lastfm_toptracks (user_id, period, track_id, playcount) VALUES (?, ?, ?, ?)",
+        toptracks()
+    )
+
+    def scrobbles():
+        for user_id in range(1, n_users + 1):
+            track_ids = np.searchsorted(artist_cdf, rng.random(SCROBBLES_PER_USER)) * TRACKS_PER_ARTIST \
+                + rng.integers(0, TRACKS_PER_ARTIST, SCROBBLES_PER_USER) + 1
+            # a play every ~3 minutes to ~2 days, going back from now
+            times = now - np.cumsum(rng.integers(180, 2 * 86400, SCROBBLES_PER_USER))
+            yield from zip([user_id] * SCROBBLES_PER_USER, track_ids.tolist(), times.tolist())
+
+    cur.executemany(
+        "INSERT OR IGNORE INTO lastfm_recent_scrobbles (user_id, track_id, scrobble_time) VALUES (?, ?, ?)",
+        scrobbles()
+    )
+
+
+def generate_itunes(cur, rng, counts):
+    n_tracks = counts["tracks"]
+    cur.executemany("INSERT INTO genres (id, genre_name) VALUES (?, ?)", enumerate(GENRES, start=1))
+
+    roll = rng.random(n_tracks)
+    matched = np.flatnonzero(roll < ITUNES_MATCH_RATE) + 1
+    not_found = np.flatnonzero((roll >= ITUNES_MATCH_RATE)
+                               & (roll < ITUNES_MATCH_RATE + ITUNES_NOT_FOUND_RATE)) + 1
+    # an artist keeps one genre, as in the real catalog
+    artist_genres = rng.integers(1, len(GENRES) + 1, counts["artists"] + 1)
+    years = rng.integers(1965, 2026, len(matched))
+    millis = rng.normal(215_000, 45_000, len(matched)).clip(60_000, 900_000).astype(int)
+    prices = rng.choice([0.69, 0.99, 1.29], len(matched), p=[0.1, 0.5, 0.4])
+
+    def rows():
+        for track_id, year, length, price in zip(matched.tolist(), years.tolist(), millis.tolist(),
+                                                 prices.tolist()):
+            artist_id = (track_id - 1) // TRACKS_PER_ARTIST + 1
+            yield (f"Track {track_id}", f"Artist {artist_id}", f"Album {artist_id}-{year}",
+                   int(artist_genres[artist_id]), f"{year}-01-01T12:00:00Z", year, length, price, 9.99,
+                   "USA", 100_000_000 + track_id, track_id)
+
+    cur.executemany("""
+        INSERT INTO itunes_tracks
+        (track_name, artist_name, collection_name, genre_id, release_date, release_year,
+         track_time_millis, track_price, collection_price, country, itunes_track_id, track_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows())
+
+    now = int(time.time())
+    cur.executemany(
+        "INSERT INTO enrichment_status (track_id, status, updated_at) VALUES (?, ?, ?)",
+        [(t, "matched", now) for t in matched.tolist()] + [(t, "not_found", now) for t in not_found.tolist()]
+    )
+    itunes_stats.save_scan_mark(cur)
+
+
+def generate_weather(cur, rng, counts):
+    cities = list(city_rows(counts["cities"]))
+    cur.executemany("INSERT INTO cities (id, name, latitude, longitude) VALUES (?, ?, ?, ?)",
+                    ((i, name, lat, lon) for i, (name, _, lat, lon) in enumerate(cities, start=1)))
+
+    start = date.today().replace(month=1, day=1) - timedelta(days=365 * WEATHER_YEARS)
+    n_days = (date.today() - start).days
+    days = [(start + timedelta(days=d)).isoformat() for d in range(n_days)]
+    season = -np.cos(2 * np.pi * (np.arange(n_days) - 15) / 365.25)   # coldest mid-January
+
+    def rows():
+        for city_id, (_, _, lat, _) in enumerate(cities, start=1):
+            mean = 95 - lat * 1.1
+            max_temp = mean + 12 + 22 * season + rng.normal(0, 6, n_days)
+            min_temp = max_temp - rng.uniform(8, 22, n_days)
+            rain = np.where(rng.random(n_days) < 0.35, rng.exponential(5, n_days), 0.0)
+            snow = np.where(max_temp < 34, rain * 0.7, 0.0)
+            rain = np.where(max_temp < 34, 0.0, rain)
+
+            columns = []
+            for col in (max_temp, min_temp, rain, snow):
+                col = col.round(2)
+                col[rng.random(n_days) < MISSING_WEATHER_RATE] = np.nan
+                columns.append(weather_stats.nan_to_none(col))
+            yield from zip([city_id] * n_days, days, *columns)
+
+    cur.executemany("""
+        INSERT INTO daily_weather (city_id, date, max_temp_f, min_temp_f, rain, snow)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows())
+    weather_stats.rebuild_weather_rollups(cur)
+
+
+def generate(db_path, scale=1.0, seed=42):
+    """
+    Creates db_path with the full schema and fills it with synthetic data:
+    Zipf-distributed artist popularity, USERS_PER_CITY users per city and
+    WEATHER_YEARS of daily weather per city. Returns the row counts used.
+    """
+    if os.path.exists(db_path):
+        raise FileExistsError(f"{db_path} already exists; generate into a new file.")
+
+    rng = np.random.default_rng(seed)
+    counts = scaled_counts(scale)
+
+    # a private connection rather than db.writer(): the bulk load wants its own pragmas
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    cur.execute("PRAGMA synchronous=OFF")
+    cur.execute("PRAGMA journal_mode=MEMORY")
+    for schema in SCHEMAS:
+        schema(cur)
+    conn.commit()
+
+    cur.execute("BEGIN")
+    # per-row summary triggers would dominate the load; the summary is rebuilt
+    # in one pass by create_itunes_schema() once the data is in
+    for trigger in ("itunes_summary_insert", "itunes_summary_delete", "itunes_summary_update"):
+        cur.execute(f"DROP TRIGGER {trigger}")
+    cur.execute("DROP TABLE itunes_summary")
+    generate_music(cur, rng, counts)
+    generate_itunes(cur, rng, counts)
+    generate_weather(cur, rng, counts)
+    conn.commit()
+
+    itunes_stats.create_itunes_schema(cur)
+    conn.commit()
+    conn.close()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic data.db at a given scale.")
+    parser.add_argument("db_path", help="new database file to create")
+    parser.add_argument("--scale", type=float, default=1.0, help="1 = ~10k top-track rows (default: 1)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    generate(args.db_path, args.scale, args.seed)
+    elapsed = time.perf_counter() - start
+
+    conn = sqlite3.connect(args.db_path)
+    for table in ("users", "artists", "tracks", "lastfm_toptracks", "lastfm_recent_scrobbles",
+                  "itunes_tracks", "cities", "daily_weather"):
+        print(f"{table}: {conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]} rows")
+    conn.close()
+    print(f"Generated {args.db_path} in {elapsed:.1f}s")
@@ -0,0 +1,160 @@
+# http_client.py
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import rate_limiter
+
+POOL_CONNECTIONS = 10   # number of per-host pools kept alive
+POOL_MAXSIZE = 20       # keep-alive connections per host
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5    # retry sleeps: 0.5s, 1s, 2s, ...
+MAX_BACKOFF = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {403, 429}   # hosts answering these get their rate limit lowered
+
+DEFAULT_TIMEOUT = 20
+HOST_TIMEOUTS = {
+    "ws.audioscrobbler.com": 20,
+    "www.last.fm": 20,
+    "itunes.apple.com": 10,
+    "geocoding-api.open-meteo.com": 10,
+    "archive-api.open-meteo.com": 60,
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+_stats = defaultdict(lambda: {
+    "requests": 0,
+    "retries": 0,
+    "errors": 0,
+    "total_seconds": 0.0,
+    "max_seconds": 0.0,
+    "throttled_seconds": 0.0,
+    "recent": deque(maxlen=1000),
+})
+_stats_lock = threading.Lock()
+
+
+def get_session():
+    """One process-wide Session so every collector reuses the same keep-alive pools."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+def record(host, seconds, error=False, retry=False):
+    with _stats_lock:
+        s = _stats[host]
+        s["requests"] += 1
+        s["errors"] += int(error)
+        s["retries"] += int(retry)
+        s["total_seconds"] += seconds
+        s["max_seconds"] = max(s["max_seconds"], seconds)
+        s["recent"].append(seconds)
+
+
+def record_throttle(host, seconds):
+    with _stats_lock:
+        _stats[host]["throttled_seconds"] += seconds
+
+
+def backoff_delay(attempt, response=None):
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(int(retry_after), MAX_BACKOFF)
+    return min(BACKOFF_FACTOR * (2 ** attempt), MAX_BACKOFF)
+
+
+def get(url, params=None, timeout=None, retries=MAX_RETRIES, **kwargs):
+    """
+    GET through the shared session with a per-host timeout and rate limit.
+    Connection errors, timeouts and 429/5xx responses are retried with
+    exponential backoff; the last response (or exception) is returned to the caller.
+    """
+    host = urlsplit(url).hostname
+    if timeout is None:
+        timeout = HOST_TIMEOUTS.get(host, DEFAULT_TIMEOUT)
+    session = get_session()
+    limiter = rate_limiter.get_limiter(host)
+
+    for attempt in range(retries + 1):
+        response = None
+        if limiter is not None:
+            waited = limiter.acquire()
+            if waited:
+                record_throttle(host, waited)
+
+        start = time.perf_counter()
+        try:
+            response = session.get(url, params=params, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            record(host, time.perf_counter() - start, error=True, retry=attempt > 0)
+            if attempt == retries:
+                raise
+        else:
+            record(host, time.perf_counter() - start, error=response.status_code >= 400, retry=attempt > 0)
+            if limiter is not None:
+                if response.status_code in THROTTLE_STATUSES:
+                    limiter.penalize()
+                elif response.ok:
+                    limiter.reward()
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+
+        time.sleep(backoff_delay(attempt, response))
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def get_stats():
+    """Returns {host: {requests, retries, errors, avg/p50/p95/max seconds, total and throttled seconds}}."""
+    with _stats_lock:
+        report = {}
+        for host, s in _stats.items():
+            recent = sorted(s["recent"])
+            report[host] = {
+                "requests": s["requests"],
+                "retries": s["retries"],
+                "errors": s["errors"],
+                "total_seconds": round(s["total_seconds"], 3),
+                "avg_seconds": round(s["total_seconds"] / s["requests"], 3) if s["requests"] else 0.0,
+                "p50_seconds": round(percentile(recent, 0.50), 3),
+                "p95_seconds": round(percentile(recent, 0.95), 3),
+                "max_seconds": round(s["max_seconds"], 3),
+                "throttled_seconds": round(s["throttled_seconds"], 3),
+            }
+        return report
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def print_stats():
+    stats = get_stats()
+    if not stats:
+        return
+    print("\n--- HTTP requests ---")
+    for host, s in sorted(stats.items(), key=lambda kv: -kv[1]["total_seconds"]):
+        print(f"{host}: {s['requests']} requests ({s['retries']} retries, {s['errors']} errors), "
+              f"total {s['total_seconds']}s, avg {s['avg_seconds']}s, "
+              f"p50 {s['p50_seconds']}s, p95 {s['p95_seconds']}s, max {s['max_seconds']}s, "
+              f"waited {s['throttled_seconds']}s for rate limit")
@@ -1,12 +1,29 @@
-import sqlite3
+import argparse
 import requests
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import http_client
+import pipeline
+import response_cache
+from key_cache import CHUNK_SIZE, KeyCache
+
+ITUNES_SEARCH_URL = 'https://itunes.apple.com/search'
+ITUNES_LOOKUP_URL = 'https://itunes.apple.com/lookup'
+ITUNES_WORKERS = 4  # concurrent searches; the actual pace is set by rate_limiter
+DEFAULT_BUDGET = 25  # tracks searched per run; None searches the whole backlog
+PAGE_SIZE = 100      # pending tracks read and written per transaction
+LOOKUP_BATCH = 150   # ids per lookup request
+ERROR_RETRY_SECONDS = 24 * 3600           # failed searches are retried after a day
+NOT_FOUND_RETRY_SECONDS = 30 * 24 * 3600  # and "not found" ones after a month
 
 def create_itunes_tables(db_name='data.db'):
-    conn = sqlite3.connect(db_name)
-    cur = conn.cursor()
-    
+    """Makes sure db_name has the iTunes tables (done once per process, see db.py)."""
+    db.writer(db_name).close()
+
+def create_itunes_schema(cur):
     cur.execute('''
         CREATE TABLE IF NOT EXISTS genres (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -27,15 +44,169 @@ def create_itunes_tables(db_name='data.db'):
             track_price REAL,
             collection_price REAL,
             country TEXT,
+            itunes_track_id INTEGER,
+            track_id INTEGER REFERENCES tracks(id),
             FOREIGN KEY (genre_id) REFERENCES genres(id),
             UNIQUE(track_name, artist_name)
         )
     ''')
 
-    conn.commit()
-    conn.close()
+    # one row per Last.fm track we have tried to enrich: 'matched', 'not_found' or 'error'
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS enrichment_status (
+            track_id INTEGER PRIMARY KEY REFERENCES tracks(id),
+            status TEXT NOT NULL CHECK (status IN ('matched', 'not_found', 'error')),
+            updated_at INTEGER NOT NULL
+        )
+    ''')
+
+    # every track up to last_track_id has an enrichment_status row, so the
+    # search for new tracks starts after it
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS enrichment_scan (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_track_id INTEGER NOT NULL
+        )
+    ''')
+
+    # older databases were created before itunes_track_id / track_id existed
+    cur.execute('PRAGMA table_info(itunes_tracks)')
+    columns = [r[1] for r in cur.fetchall()]
+    if 'itunes_track_id' not in columns:
+        cur.execute('ALTER TABLE itunes_tracks ADD COLUMN itunes_track_id INTEGER')
+    if 'track_id' not in columns:
+        cur.execute('ALTER TABLE itunes_tracks ADD COLUMN track_id INTEGER REFERENCES tracks(id)')
+        backfill_track_links(cur)
+
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_itunes_tracks_itunes_id ON itunes_tracks (itunes_track_id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_itunes_tracks_track_id ON itunes_tracks (track_id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_enrichment_status ON enrichment_status (status, updated_at)')
+
+    create_itunes_summary(cur)
+
+db.register_schema(create_itunes_schema)
+
+SUMMARY_SCOPES = (
+    # scope, key expression, condition
+    ('all', '0', '1'),
+    ('genre', '{row}.genre_id', '{row}.genre_id IS NOT NULL'),
+    ('year', '{row}.release_year', '{row}.release_year IS NOT NULL'),
+)
+
+def summary_upserts(row, sign):
+    """SQL adding (sign=1) or removing (sign=-1) one itunes_tracks row from every summary scope."""
+    statements = []
+    for scope, key, condition in SUMMARY_SCOPES:
+        statements.append(f'''
+            INSERT INTO itunes_summary
+            (scope, key, track_count, length_sum, length_count, price_sum, price_count, year_sum, year_count)
+            SELECT '{scope}', {key.format(row=row)}, {sign},
+                   {sign} * COALESCE({row}.track_time_millis, 0), {sign} * ({row}.track_time_millis IS NOT NULL),
+                   {sign} * COALESCE({row}.track_price, 0), {sign} * ({row}.track_price IS NOT NULL),
+                   {sign} * COALESCE({row}.release_year, 0), {sign} * ({row}.release_year IS NOT NULL)
+            WHERE {condition.format(row=row)}
+            ON CONFLICT (scope, key) DO UPDATE SET
+                track_count = track_count + excluded.track_count,
+                length_sum = length_sum + excluded.length_sum,
+                length_count = length_count + excluded.length_count,
+                price_sum = price_sum + excluded.price_sum,
+                price_count = price_count + excluded.price_count,
+                year_sum = year_sum + excluded.year_sum,
+                year_count = year_count + excluded.year_count;
+        ''')
+    return ''.join(statements)
+
+def create_itunes_summary(cur):
+    """
+    itunes_summary holds running counts and sums for the whole table ('all'),
+    per genre and per release year, kept current by triggers on itunes_tracks
+    so reports never have to scan the catalog.
+    """
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'itunes_summary'")
+    exists = cur.fetchone() is not None
+
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS itunes_summary (
+            scope TEXT NOT NULL,
+            key INTEGER NOT NULL,
+            track_count INTEGER NOT NULL,
+            length_sum REAL NOT NULL,
+            length_count INTEGER NOT NULL,
+            price_sum REAL NOT NULL,
+            price_count INTEGER NOT NULL,
+            year_sum REAL NOT NULL,
+            year_count INTEGER NOT NULL,
+            PRIMARY KEY (scope, key)
+        )
+    ''')
+
+    cur.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS itunes_summary_insert AFTER INSERT ON itunes_tracks
+        BEGIN {summary_upserts('NEW', 1)} END
+    ''')
+    cur.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS itunes_summary_delete AFTER DELETE ON itunes_tracks
+        BEGIN {summary_upserts('OLD', -1)} END
+    ''')
+    cur.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS itunes_summary_update
+        AFTER UPDATE OF genre_id, release_year, track_time_millis, track_price ON itunes_tracks
+        BEGIN {summary_upserts('OLD', -1)} {summary_upserts('NEW', 1)} END
+    ''')
+
+    if not exists:
+        rebuild_itunes_summary(cur)
+
+def rebuild_itunes_summary(cur):
+    """Recomputes itunes_summary from scratch in a single GROUP BY pass over itunes_tracks."""
+    cur.execute('''
+        SELECT genre_id, release_year, COUNT(*),
+               COALESCE(SUM(track_time_millis), 0), COUNT(track_time_millis),
+               COALESCE(SUM(track_price), 0), COUNT(track_price),
+               COALESCE(SUM(release_year), 0), COUNT(release_year)
+        FROM itunes_tracks
+        GROUP BY genre_id, release_year
+    ''')
+
+    totals = {}
+    for genre_id, release_year, *stats in cur.fetchall():
+        keys = [('all', 0)]
+        if genre_id is not None:
+            keys.append(('genre', genre_id))
+        if release_year is not None:
+            keys.append(('year', release_year))
+        for key in keys:
+            current = totals.setdefault(key, [0] * len(stats))
+            for i, value in enumerate(stats):
+                current[i] += value
+
+    cur.execute('DELETE FROM itunes_summary')
+    cur.executemany('''
+        INSERT INTO itunes_summary
+        (scope, key, track_count, length_sum, length_count, price_sum, price_count, year_sum, year_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(scope, key, *stats) for (scope, key), stats in totals.items()])
+
+def backfill_track_links(cur):
+    """Links existing itunes_tracks rows to their source track where the names still match exactly."""
+    cur.execute('''
+        UPDATE itunes_tracks SET track_id = (
+            SELECT t.id FROM tracks t
+            JOIN artists a ON t.artist_id = a.id
+            WHERE t.name = itunes_tracks.track_name AND a.name = itunes_tracks.artist_name
+        )
+        WHERE track_id IS NULL
+    ''')
+    cur.execute('''
+        INSERT OR IGNORE INTO enrichment_status (track_id, status, updated_at)
+        SELECT track_id, 'matched', CAST(strftime('%s', 'now') AS INTEGER)
+        FROM itunes_tracks WHERE track_id IS NOT NULL
+    ''')
+
+def get_or_create_genre(cur, genre_name, genre_cache=None):
+    if genre_cache is not None:
+        return genre_cache.resolve(cur, genre_name)
 
-def get_or_create_genre(cur, genre_name):
     cur.execute('SELECT id FROM genres WHERE genre_name = ?', (genre_name,))
     result = cur.fetchone()
     
@@ -45,126 +216,334 @@ def get_or_create_genre(cur, genre_name):
         cur.execute('INSERT INTO genres (genre_name) VALUES (?)', (genre_name,))
         return cur.lastrowid
 
-def itunes_stats(music_stats_dict, db_name='data.db'):
-    conn = sqlite3.connect(db_name)
-    cur = conn.cursor()
-    create_itunes_tables(db_name)
-    
+def search_itunes(track_name, artist_name):
+    params = {
+        'term': f"{track_name} {artist_name}",
+        'media': 'music',
+        'entity': 'song',
+        'limit': 5
+    }
+    return response_cache.get_json(
+        ITUNES_SEARCH_URL, params=params,
+        is_negative=lambda data: data.get('resultCount', 0) == 0
+    )
+
+def pick_best_result(track_name, artist_name, data):
+    if data.get('resultCount', 0) == 0:
+        return None
+
+    for result in data.get('results', []):
+        if (track_name.lower() in result.get('trackName', '').lower() and 
+            artist_name.lower() in result.get('artistName', '').lower()):
+            return result
+
+    return data['results'][0]
+
+def itunes_row(track_id, track_name, artist_name, track_data, genre_id):
+    release_date = track_data.get('releaseDate', '')
+    release_year = None
+    if release_date:
+        try:
+            release_year = int(release_date.split('-')[0])
+        except:
+            release_year = None
+
+    return (
+        track_data.get('trackName', track_name),
+        track_data.get('artistName', artist_name),
+        track_data.get('collectionName'),
+        genre_id,
+        release_date,
+        release_year,
+        track_data.get('trackTimeMillis'),
+        track_data.get('trackPrice'),
+        track_data.get('collectionPrice'),
+        track_data.get('country'),
+        track_data.get('trackId'),
+        track_id
+    )
+
+def existing_itunes_keys(cur, keys):
+    found = set()
+    for start in range(0, len(keys), CHUNK_SIZE):
+        chunk = keys[start:start + CHUNK_SIZE]
+        values_sql = ', '.join(['(?, ?)'] * len(chunk))
+        cur.execute(f'''
+            SELECT track_name, artist_name FROM itunes_tracks
+            WHERE (track_name, artist_name) IN (VALUES {values_sql})
+        ''', [v for k in chunk for v in k])
+        found.update(cur.fetchall())
+    return found
+
+def store_itunes_rows(cur, rows):
+    """Bulk-inserts itunes_tracks rows; returns a flag per row telling whether it was new."""
+    seen = existing_itunes_keys(cur, [(r[0], r[1]) for r in rows])
+    is_new = []
+    for row in rows:
+        is_new.append((row[0], row[1]) not in seen)
+        seen.add((row[0], row[1]))
+
+    cur.executemany('''
+        INSERT OR IGNORE INTO itunes_tracks 
+        (track_name, artist_name, collection_name, genre_id, release_date, 
+         release_year, track_time_millis, track_price, collection_price, country,
+         itunes_track_id, track_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [row for row, new in zip(rows, is_new) if new])
+    return is_new
+
+def record_status(cur, statuses):
+    """statuses: list of (track_id, status) for this page."""
+    cur.executemany('''
+        INSERT OR REPLACE INTO enrichment_status (track_id, status, updated_at)
+        VALUES (?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+    ''', statuses)
+
+# tracks never searched, walked by primary key from the scan mark on
+NEW_TRACKS_SQL = '''
+    SELECT t.id, t.name AS track_name, a.name AS artist_name
+    FROM tracks t
+    JOIN artists a ON t.artist_id = a.id
+    LEFT JOIN enrichment_status es ON es.track_id = t.id
+    WHERE t.id > ? AND es.track_id IS NULL
+    ORDER BY t.id
+    LIMIT ?
+'''
+
+# one status's results older than a cutoff, walked along idx_enrichment_status
+RETRY_TRACKS_SQL = '''
+    SELECT es.track_id, t.name AS track_name, a.name AS artist_name, es.updated_at
+    FROM enrichment_status es
+    JOIN tracks t ON t.id = es.track_id
+    JOIN artists a ON t.artist_id = a.id
+    WHERE es.status = ? AND es.updated_at < ?
+      AND (es.updated_at, es.track_id) > (?, ?)
+    ORDER BY es.updated_at, es.track_id
+    LIMIT ?
+'''
+
+# the track before the first one with no status row (or the last track): the next scan mark
+SCAN_MARK_SQL = '''
+    SELECT COALESCE(
+        (SELECT t.id - 1
+         FROM tracks t
+         LEFT JOIN enrichment_status es ON es.track_id = t.id
+         WHERE t.id > ? AND es.track_id IS NULL
+         ORDER BY t.id
+         LIMIT 1),
+        (SELECT MAX(id) FROM tracks),
+        0)
+'''
+
+def get_scan_mark(cur):
+    cur.execute('SELECT last_track_id FROM enrichment_scan WHERE id = 1')
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+def save_scan_mark(cur):
+    """Moves the scan mark past every track that now has an enrichment_status row."""
+    cur.execute(SCAN_MARK_SQL, (get_scan_mark(cur),))
+    mark = cur.fetchone()[0]
     cur.execute('''
-        SELECT DISTINCT t.name AS track_name, a.name AS artist_name
-        FROM tracks t
-        JOIN artists a ON t.artist_id = a.id
-        WHERE NOT EXISTS (
-            SELECT 1 FROM itunes_tracks it
-            WHERE it.track_name = t.name AND it.artist_name = a.name
-        )
-        LIMIT 25
-    ''')
-    
-    tracks = cur.fetchall()
-    
+        INSERT INTO enrichment_scan (id, last_track_id) VALUES (1, ?)
+        ON CONFLICT (id) DO UPDATE SET last_track_id = excluded.last_track_id
+    ''', (mark,))
+
+def iter_unenriched_tracks(conn, page_size=PAGE_SIZE):
+    """
+    Yields pages of (track_id, track_name, artist_name) that still need enrichment:
+    first the tracks with no enrichment_status row, found by primary key after
+    the saved scan mark, then the errors and not-found results old enough to be
+    retried, read off idx_enrichment_status. Neither side walks tracks that are
+    already done, so cost follows the pending work rather than the table size.
+    """
+    last_id = get_scan_mark(conn.cursor())
+    while True:
+        page = conn.execute(NEW_TRACKS_SQL, (last_id, page_size)).fetchall()
+        if not page:
+            break
+        yield page
+        last_id = page[-1][0]
+
+    now = int(time.time())
+    for status, retry_seconds in (('error', ERROR_RETRY_SECONDS), ('not_found', NOT_FOUND_RETRY_SECONDS)):
+        last = (-1, 0)
+        while True:
+            page = conn.execute(RETRY_TRACKS_SQL, (status, now - retry_seconds, *last, page_size)).fetchall()
+            if not page:
+                break
+            yield [row[:3] for row in page]
+            last = (page[-1][3], page[-1][0])
+
+def iter_pending_tracks(conn, budget=DEFAULT_BUDGET, page_size=PAGE_SIZE):
+    """iter_unenriched_tracks() one track at a time, stopping after budget tracks (None = all)."""
+    if budget is not None:
+        page_size = max(1, min(page_size, budget))
+    count = 0
+    for page in iter_unenriched_tracks(conn, page_size):
+        for track in page:
+            if budget is not None and count >= budget:
+                return
+            count += 1
+            yield track
+
+def itunes_stats(music_stats_dict, db_name='data.db', budget=DEFAULT_BUDGET, workers=ITUNES_WORKERS,
+                 page_size=PAGE_SIZE):
+    """
+    Enriches unenriched Last.fm tracks with iTunes metadata.
+    budget is the number of tracks to search this run (None = the whole backlog).
+    Pending tracks are streamed through a pipeline.run(): `workers` threads search
+    under the iTunes rate limit, results are parsed, and every page_size tracks
+    have their genres resolved and are written in one transaction.
+    """
+    conn = db.writer(db_name)
+    cur = conn.cursor()
+    source = db.reader(db_name)  # pending tracks are read alongside the writes
+
     itunes_results = {
         'tracks_processed': 0,
         'tracks_found': 0,
         'tracks_not_found': 0,
         'track_details': []
     }
-    
-    for track_name, artist_name in tracks:
-        base_url = 'https://itunes.apple.com/search'
-        query = f"{track_name} {artist_name}"
-        
-        params = {
-            'term': query,
-            'media': 'music',
-            'entity': 'song',
-            'limit': 5
-        }
-        
+    batch = []    # parsed tracks waiting for the next write
+
+    def fetch(track):
+        track_id, track_name, artist_name = track
         try:
-            response = requests.get(base_url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data.get('resultCount', 0) > 0:
-                track_data = None
-                for result in data.get('results', []):
-                    if (track_name.lower() in result.get('trackName', '').lower() and 
-                        artist_name.lower() in result.get('artistName', '').lower()):
-                        track_data = result
-                        break
-                
-                if not track_data:
-                    track_data = data['results'][0]
-                
-                genre_name = track_data.get('primaryGenreName', 'Unknown')
-                genre_id = get_or_create_genre(cur, genre_name)
-                
-                release_date = track_data.get('releaseDate', '')
-                release_year = None
-                if release_date:
-                    try:
-                        release_year = int(release_date.split('-')[0])
-                    except:
-                        release_year = None
-                
-                try:
-                    cur.execute('''
-                        INSERT INTO itunes_tracks 
-                        (track_name, artist_name, collection_name, genre_id, release_date, 
-                         release_year, track_time_millis, track_price, collection_price, country)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        track_data.get('trackName', track_name),
-                        track_data.get('artistName', artist_name),
-                        track_data.get('collectionName'),
-                        genre_id,
-                        release_date,
-                        release_year,
-                        track_data.get('trackTimeMillis'),
-                        track_data.get('trackPrice'),
-                        track_data.get('collectionPrice'),
-                        track_data.get('country')
-                    ))
-                    
-                    itunes_results['tracks_found'] += 1
-                    itunes_results['track_details'].append({
-                        'track': track_name,
-                        'artist': artist_name,
-                        'genre': genre_name
-                    })
-                    
-                    print(f"Successfully stored: '{track_name}' by {artist_name}")
-                    
-                except sqlite3.IntegrityError:
-                    print(f"Duplicate detected, skipping: '{track_name}' by {artist_name}")
+            return track, search_itunes(track_name, artist_name), None
+        except requests.exceptions.RequestException as e:
+            return track, None, e
 
-            else:
+    def parse(result):
+        track, data, error = result
+        if error is not None:
+            return track, 'error', error
+        track_data = pick_best_result(track[1], track[2], data)
+        if track_data is None:
+            return track, 'not_found', None
+        return track, 'matched', track_data
+
+    def write(result):
+        batch.append(result)
+        if len(batch) >= page_size:
+            write_batch()
+
+    def write_batch():
+        rows = []
+        details = []
+        statuses = []
+        # found is the picked search result, or the request error
+        for (track_id, track_name, artist_name), status, found in batch:
+            itunes_results['tracks_processed'] += 1
+            statuses.append((track_id, status))
+            if status == 'error':
+                print(f"Error fetching data from iTunes API: {found}")
+                itunes_results['tracks_not_found'] += 1
+                continue
+            if status == 'not_found':
                 itunes_results['tracks_not_found'] += 1
                 print(f"Track '{track_name}' by {artist_name} not found on iTunes.")
-                
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching data from iTunes API: {e}")
-            itunes_results['tracks_not_found'] += 1
-        
-        itunes_results['tracks_processed'] += 1
-        time.sleep(0.5)
-    
-    conn.commit()
-    conn.close()
-    
+                continue
+
+            # genres are resolved here, on the one thread that uses the writer
+            genre_id = get_or_create_genre(cur, found.get('primaryGenreName', 'Unknown'), genre_cache)
+            rows.append(itunes_row(track_id, track_name, artist_name, found, genre_id))
+            details.append({
+                'track': track_name,
+                'artist': artist_name,
+                'genre': found.get('primaryGenreName', 'Unknown')
+            })
+
+        for detail, is_new in zip(details, store_itunes_rows(cur, rows)):
+            if is_new:
+                itunes_results['tracks_found'] += 1
+                itunes_results['track_details'].append(detail)
+                print(f"Successfully stored: '{detail['track']}' by {detail['artist']}")
+            else:
+                print(f"Duplicate detected, skipping: '{detail['track']}' by {detail['artist']}")
+
+        record_status(cur, statuses)
+        conn.commit()
+        batch.clear()
+
+    try:
+        genre_cache = KeyCache('genres', ('genre_name',)).warm(cur)
+        pipeline.run(iter_pending_tracks(source, budget, page_size), [
+            pipeline.Stage('fetch', fetch, workers),
+            pipeline.Stage('parse', parse),
+            pipeline.Stage('write', write),
+        ])
+        if batch:
+            write_batch()
+        save_scan_mark(cur)
+        conn.commit()
+    finally:
+        source.close()
+        conn.close()
+
     return itunes_results
 
-conn = sqlite3.connect('data.db')
-cur = conn.cursor()
-create_itunes_tables('data.db')
+def lookup_itunes(itunes_ids):
+    """
+    One lookup request for up to LOOKUP_BATCH iTunes track ids; returns {trackId: result}.
+    Answers come from response_cache while its lookup TTL lasts.
+    """
+    data = response_cache.get_json(ITUNES_LOOKUP_URL, params={
+        'id': ','.join(str(i) for i in itunes_ids),
+        'entity': 'song'
+    }, is_negative=lambda data: data.get('resultCount', 0) == 0)
+    return {r['trackId']: r for r in data.get('results', []) if r.get('trackId')}
+
+def refresh_itunes_tracks(db_name='data.db', workers=ITUNES_WORKERS, batch_size=LOOKUP_BATCH):
+    """
+    Re-fetches rows whose iTunes id is already known through the multi-id lookup
+    endpoint (batch_size ids per request) and updates prices/collection in bulk.
+    Returns the number of rows updated.
+    """
+    conn = db.writer(db_name)
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT itunes_track_id FROM itunes_tracks WHERE itunes_track_id IS NOT NULL')
+        ids = [r[0] for r in cur.fetchall()]
+        batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+
+        updated = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for found in pool.map(lookup_itunes, batches):
+                cur.executemany('''
+                    UPDATE itunes_tracks
+                    SET collection_name = ?, track_time_millis = ?, track_price = ?,
+                        collection_price = ?, country = ?
+                    WHERE itunes_track_id = ?
+                ''', [
+                    (r.get('collectionName'), r.get('trackTimeMillis'), r.get('trackPrice'),
+                     r.get('collectionPrice'), r.get('country'), track_id)
+                    for track_id, r in found.items()
+                ])
+                updated += cur.rowcount
+                conn.commit()
+    finally:
+        conn.close()
+    return updated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect iTunes metadata for Last.fm tracks.")
+    parser.add_argument('--budget', type=int, default=DEFAULT_BUDGET,
+                        help="tracks to search this run (0 = whole backlog)")
+    parser.add_argument('--workers', type=int, default=ITUNES_WORKERS)
+    parser.add_argument('--refresh', action='store_true',
+                        help="also refresh already-enriched tracks via the lookup endpoint")
+    args = parser.parse_args()
 
-print("Collecting iTunes metadata for Last.fm tracks...")
-result = itunes_stats({}, 'data.db')
+    print("Collecting iTunes metadata for Last.fm tracks...")
+    result = itunes_stats({}, 'data.db', budget=args.budget or None, workers=args.workers)
 
-print(f"\n--- Summary ---")
-print(f"Tracks processed: {result['tracks_processed']}")
-print(f"Tracks found: {result['tracks_found']}")
-print(f"Tracks not found: {result['tracks_not_found']}")
+    print(f"\n--- Summary ---")
+    print(f"Tracks processed: {result['tracks_processed']}")
+    print(f"Tracks found: {result['tracks_found']}")
+    print(f"Tracks not found: {result['tracks_not_found']}")
 
-conn.close()
+    if args.refresh:
+        print(f"Tracks refreshed: {refresh_itunes_tracks('data.db', workers=args.workers)}")
+    http_client.print_stats()
@@ -0,0 +1,91 @@
+# key_cache.py
+from collections import OrderedDict
+
+DEFAULT_CAPACITY = 50000
+CHUNK_SIZE = 400  # keys per multi-row statement, keeps us under SQLite's 999 variable limit
+
+
+class KeyCache:
+    """
+    Bounded LRU map from a dimension table's natural key to its id.
+    Keys are the column value for single-column keys (artists.name) and a tuple
+    for compound keys (tracks.name, tracks.artist_id). Misses are resolved in bulk:
+    one multi-row INSERT OR IGNORE plus one SELECT per chunk of keys.
+    """
+
+    def __init__(self, table, key_columns, capacity=DEFAULT_CAPACITY):
+        self.table = table
+        self.key_columns = tuple(key_columns)
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._ids = OrderedDict()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _key(self, row):
+        return row[0] if len(self.key_columns) == 1 else tuple(row)
+
+    def put(self, key, key_id):
+        self._ids[key] = key_id
+        self._ids.move_to_end(key)
+        if len(self._ids) > self.capacity:
+            self._ids.popitem(last=False)
+
+    def get(self, key):
+        key_id = self._ids.get(key)
+        if key_id is not None:
+            self._ids.move_to_end(key)
+        return key_id
+
+    def warm(self, cur):
+        """Preload the most recently created ids, up to capacity."""
+        cols = ", ".join(self.key_columns)
+        cur.execute(f"SELECT id, {cols} FROM {self.table} ORDER BY id DESC LIMIT ?", (self.capacity,))
+        for row in reversed(cur.fetchall()):
+            self.put(self._key(row[1:]), row[0])
+        return self
+
+    def resolve_many(self, cur, keys):
+        """Returns {key: id} for every key, creating missing rows."""
+        found = {}
+        missing = []
+        for key in keys:
+            if key in found:
+                continue
+            key_id = self.get(key)
+            if key_id is None:
+                if key not in missing:
+                    missing.append(key)
+            else:
+                found[key] = key_id
+                self.hits += 1
+
+        self.misses += len(missing)
+        for start in range(0, len(missing), CHUNK_SIZE):
+            chunk = missing[start:start + CHUNK_SIZE]
+            for key, key_id in self._fetch_or_create(cur, chunk).items():
+                found[key] = key_id
+                self.put(key, key_id)
+
+        return found
+
+    def resolve(self, cur, key):
+        return self.resolve_many(cur, [key])[key]
+
+    def _fetch_or_create(self, cur, chunk):
+        cols = ", ".join(self.key_columns)
+        width = len(self.key_columns)
+        row_sql = "(" + ", ".join("?" * width) + ")"
+        values_sql = ", ".join([row_sql] * len(chunk))
+        params = [v for key in chunk for v in ((key,) if width == 1 else key)]
+
+        cur.execute(f"INSERT OR IGNORE INTO {self.table} ({cols}) VALUES {values_sql}", params)
+
+        if width == 1:
+            where = f"{cols} IN ({', '.join('?' * len(chunk))})"
+        else:
+            where = f"({cols}) IN (VALUES {values_sql})"
+        cur.execute(f"SELECT id, {cols} FROM {self.table} WHERE {where}", params)
+        return {self._key(row[1:]): row[0] for row in cur.fetchall()}
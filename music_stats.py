@@ -1,11 +1,55 @@
 #music_stats.py
+import re
+import time
+from datetime import datetime, timezone
 
-import requests
-import sqlite3
-from bs4 import BeautifulSoup
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+import db
+import http_client
+import pipeline
+from key_cache import CHUNK_SIZE, KeyCache
 
 DB_PATH = "data.db"
 LASTFM_API_ROOT = "http://ws.audioscrobbler.com/2.0/"
+LASTFM_WEB_ROOT = "https://www.last.fm"
+DEFAULT_WORKERS = 8   # concurrent fetches in music_stats_many()
+PARSE_WORKERS = 2     # library pages parsed at once in music_stats_many()
+COMMIT_EVERY = 20     # pages (two per user) written per commit in music_stats_many()
+HTML_PARSER = "xpath" # library page parser: "xpath" (lxml) or "bs4"
+
+DAY = 86400
+TIME_UNITS = {"second": 1, "minute": 60, "hour": 3600, "day": DAY, "week": 7 * DAY}
+RELATIVE_TIME = re.compile(r"^(a|an|\d+) (second|minute|hour|day|week)s? ago$")
+ABSOLUTE_TIME_FORMATS = ("%A %d %b %Y, %I:%M%p", "%d %b %Y, %I:%M%p", "%d %b %Y %I:%M%p")
+
+# fact tables are clustered on their natural key, with no rowid alongside it
+PERIOD_CODES = {"overall": 0, "7day": 1, "1month": 2, "3month": 3, "6month": 4, "12month": 5}
+TOPTRACKS_TABLE = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        user_id INTEGER NOT NULL,
+        period INTEGER NOT NULL,
+        track_id INTEGER NOT NULL,
+        playcount INTEGER NOT NULL,
+        PRIMARY KEY (user_id, period, track_id),
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (track_id) REFERENCES tracks(id)
+    ) WITHOUT ROWID;
+"""
+SCROBBLES_TABLE = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        user_id INTEGER NOT NULL,
+        track_id INTEGER NOT NULL,
+        scrobble_time INTEGER NOT NULL,
+        PRIMARY KEY (user_id, scrobble_time, track_id),
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (track_id) REFERENCES tracks(id)
+    ) WITHOUT ROWID;
+"""
 
 
 def init_db(cur):
@@ -42,37 +86,108 @@ def init_db(cur):
         );
     """)
 
+    # Last.fm's period names, stored in the fact tables as their small integer code
     cur.execute("""
-        CREATE TABLE IF NOT EXISTS lastfm_toptracks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            period TEXT NOT NULL,
-            track_id INTEGER NOT NULL,
-            playcount INTEGER NOT NULL,
-            UNIQUE(user_id, period, track_id),
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (track_id) REFERENCES tracks(id)
+        CREATE TABLE IF NOT EXISTS lastfm_periods (
+            code INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL
         );
     """)
+    # checked first: report processes run this too and must not need the write lock
+    cur.execute("SELECT name FROM lastfm_periods")
+    known = {row[0] for row in cur.fetchall()}
+    missing = [(code, name) for name, code in PERIOD_CODES.items() if name not in known]
+    if missing:
+        cur.executemany("INSERT INTO lastfm_periods (code, name) VALUES (?, ?)", missing)
+
+    cur.execute(TOPTRACKS_TABLE.format(name="lastfm_toptracks"))
+    cur.execute(SCROBBLES_TABLE.format(name="lastfm_recent_scrobbles"))
+    migrate_toptracks(cur)
+    migrate_scrobbles(cur)
+    cur.execute("DROP INDEX IF EXISTS idx_scrobbles_user_time")  # now the primary key's prefix
+
+    # covers the per-user report queries: filter on (user_id, period), read
+    # playcount and track_id from the index, already in chart order
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_toptracks_user_period_playcount
+        ON lastfm_toptracks (user_id, period, playcount DESC, track_id);
+    """)
 
+    # high-water marks for incremental sync, one row per user and source
+    # ("toptracks:<period>" or "scrobbles")
     cur.execute("""
-        CREATE TABLE IF NOT EXISTS lastfm_recent_scrobbles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
+        CREATE TABLE IF NOT EXISTS sync_state (
             user_id INTEGER NOT NULL,
-            track_id INTEGER NOT NULL,
-            scrobble_time TEXT,
-            UNIQUE(user_id, track_id, scrobble_time),
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (track_id) REFERENCES tracks(id)
+            source TEXT NOT NULL,
+            last_scrobble_ts INTEGER,
+            last_page INTEGER,
+            updated_at INTEGER NOT NULL,
+            PRIMARY KEY (user_id, source),
+            FOREIGN KEY (user_id) REFERENCES users(id)
         );
     """)
 
 
+db.register_schema(init_db)
+
+
+def migrate_toptracks(cur):
+    """Rebuilds a lastfm_toptracks table in the old layout (id rowid, period names)."""
+    if "id" not in db.table_columns(cur, "lastfm_toptracks"):
+        return
+
+    def fill(cur, new):
+        cur.execute(f"""
+            INSERT OR IGNORE INTO {new} (user_id, period, track_id, playcount)
+            SELECT t.user_id, p.code, t.track_id, t.playcount
+            FROM lastfm_toptracks t
+            JOIN lastfm_periods p ON p.name = t.period
+        """)
+
+    db.rebuild_table(cur, "lastfm_toptracks", TOPTRACKS_TABLE, fill)
+
+
+def migrate_scrobbles(cur):
+    """
+    Rebuilds a lastfm_recent_scrobbles table in an older layout (id rowid,
+    maybe display-text times). Rows without a time are dropped.
+    """
+    columns = db.table_columns(cur, "lastfm_recent_scrobbles")
+    if "id" not in columns:
+        return
+
+    def fill(cur, new):
+        if columns["scrobble_time"] != "TEXT":
+            cur.execute(f"""
+                INSERT OR IGNORE INTO {new} (user_id, track_id, scrobble_time)
+                SELECT user_id, track_id, scrobble_time
+                FROM lastfm_recent_scrobbles
+                WHERE scrobble_time IS NOT NULL
+            """)
+            return
+
+        cur.execute("SELECT id, user_id, track_id, scrobble_time FROM lastfm_recent_scrobbles ORDER BY user_id, id")
+        rows = cur.fetchall()
+        times = legacy_scrobble_times([(r[0], r[1], r[3]) for r in rows], int(time.time()))
+        # the same play stored under two display texts collapses into one row here
+        cur.executemany(f"""
+            INSERT OR IGNORE INTO {new} (user_id, track_id, scrobble_time)
+            VALUES (?, ?, ?)
+        """, [(r[1], r[2], times[r[0]]) for r in rows if times[r[0]] is not None])
+
+    db.rebuild_table(cur, "lastfm_recent_scrobbles", SCROBBLES_TABLE, fill)
+
+
+def period_code(period):
+    try:
+        return PERIOD_CODES[period]
+    except KeyError:
+        raise ValueError(f"Unknown Last.fm period {period!r}; expected one of {', '.join(PERIOD_CODES)}")
+
+
 def get_usernames_from_db(db_path=DB_PATH):
-    conn = sqlite3.connect(db_path)
+    conn = db.reader(db_path)
     cur = conn.cursor()
-    init_db(cur)
-    conn.commit()
 
     cur.execute("SELECT username FROM profiles ORDER BY state, city")
     users = [r[0] for r in cur.fetchall()]
@@ -86,14 +201,8 @@ def get_or_create_id(cur, table, column, value):
     return cur.fetchone()[0]
 
 
-def get_or_create_track_id(cur, track_name, artist_id):
-    cur.execute("INSERT OR IGNORE INTO tracks (name, artist_id) VALUES (?, ?)", (track_name, artist_id))
-    cur.execute("SELECT id FROM tracks WHERE name=? AND artist_id=?", (track_name, artist_id))
-    return cur.fetchone()[0]
-
-
-def collect_api_toptracks(cur, user_id, username, api_key, period, api_page, row_limit):
-    inserted = 0
+def fetch_api_toptracks_page(username, api_key, period, api_page):
+    """Returns (tracks, total_pages) for one page of user.getTopTracks."""
     params = {
         "method": "user.getTopTracks",
         "user": username,
@@ -104,51 +213,62 @@ def collect_api_toptracks(cur, user_id, username, api_key, period, api_page, row
         "format": "json"
     }
 
-    r = requests.get(LASTFM_API_ROOT, params=params, timeout=20)
+    r = http_client.get(LASTFM_API_ROOT, params=params)
     r.raise_for_status()
     data = r.json()
 
     if "error" in data:
         raise ValueError(f"Last.fm error {data.get('error')}: {data.get('message')}")
 
-    tracks = data.get("toptracks", {}).get("track", [])
-    for t in tracks:
-        if inserted >= row_limit:
-            break
+    toptracks = data.get("toptracks", {})
+    total_pages = int(toptracks.get("@attr", {}).get("totalPages", 0) or 0)
+    return toptracks.get("track", []), total_pages
 
-        track_name = t.get("name")
-        artist_name = t.get("artist", {}).get("name")
-        playcount = int(t.get("playcount", 0))
 
-        if not track_name or not artist_name:
+def class_test(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+if lxml_html is not None:
+    # compiled once; same selections as the BeautifulSoup path below
+    ROW_XPATH = etree.XPath(f"//tr[{class_test('chartlist-row')}]")
+    NAME_XPATH = etree.XPath(f"(.//*[{class_test('chartlist-name')}]//a)[1]")
+    ARTIST_XPATH = etree.XPath(f"(.//*[{class_test('chartlist-artist')}]//a)[1]")
+    TIME_XPATH = etree.XPath(f"(.//*[{class_test('chartlist-timestamp')}])[1]")
+    TITLE_XPATH = etree.XPath("string((.//@title)[1])")
+
+
+def element_text(el):
+    # matches BeautifulSoup's get_text(strip=True)
+    return "".join(piece.strip() for piece in el.itertext())
+
+
+def parse_library_rows_xpath(html):
+    parsed = []
+    for row in ROW_XPATH(lxml_html.fromstring(html)):
+        track_tag = NAME_XPATH(row)
+        artist_tag = ARTIST_XPATH(row)
+        time_tag = TIME_XPATH(row)
+
+        if not track_tag or not artist_tag:
             continue
 
-        artist_id = get_or_create_id(cur, "artists", "name", artist_name)
-        track_id = get_or_create_track_id(cur, track_name, artist_id)
+        track_name = element_text(track_tag[0])
+        artist_name = element_text(artist_tag[0])
+        time_text = element_text(time_tag[0]) if time_tag else None
+        time_title = (TITLE_XPATH(time_tag[0]) or None) if time_tag else None
+        parsed.append((track_name, artist_name, time_text, time_title))
 
-        try:
-            cur.execute("""
-                INSERT INTO lastfm_toptracks (user_id, period, track_id, playcount)
-                VALUES (?, ?, ?, ?)
-            """, (user_id, period, track_id, playcount))
-            inserted += 1
-        except sqlite3.IntegrityError:
-            pass
-
-    return inserted
-
-
-def collect_recent_scrobbles(cur, user_id, username, scrape_page, row_limit):
-    inserted = 0
-    url = f"https://www.last.fm/user/{username}/library?page={scrape_page}"
-    html = requests.get(url, timeout=20).text
-    soup = BeautifulSoup(html, "lxml")
-    rows = soup.select("tr.chartlist-row")
-
-    for row in rows:
-        if inserted >= row_limit:
-            break
+    return parsed
+
+
+def parse_library_rows_bs4(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")  # stdlib parser, so this path works without lxml
 
+    parsed = []
+    for row in soup.select("tr.chartlist-row"):
         track_tag = row.select_one(".chartlist-name a")
         artist_tag = row.select_one(".chartlist-artist a")
         time_tag = row.select_one(".chartlist-timestamp")
@@ -158,46 +278,316 @@ def collect_recent_scrobbles(cur, user_id, username, scrape_page, row_limit):
 
         track_name = track_tag.get_text(strip=True)
         artist_name = artist_tag.get_text(strip=True)
-        scrobble_time = time_tag.get_text(strip=True) if time_tag else None
+        time_text = time_tag.get_text(strip=True) if time_tag else None
+        titled = time_tag.select_one("[title]") if time_tag else None
+        time_title = titled.get("title") if titled else None
+        parsed.append((track_name, artist_name, time_text, time_title))
 
-        artist_id = get_or_create_id(cur, "artists", "name", artist_name)
-        track_id = get_or_create_track_id(cur, track_name, artist_id)
+    return parsed
 
-        try:
-            cur.execute("""
-                INSERT INTO lastfm_recent_scrobbles (user_id, track_id, scrobble_time)
-                VALUES (?, ?, ?)
-            """, (user_id, track_id, scrobble_time))
-            inserted += 1
-        except sqlite3.IntegrityError:
-            pass
 
-    return inserted
+def parse_library_rows(html, backend=None, fetched_at=None):
+    """
+    Pulls (track, artist, scrobble_time) out of a library page's chartlist rows,
+    with scrobble_time as UTC epoch seconds (see parse_scrobble_time()).
+    backend is "xpath" (compiled lxml XPath, the default when lxml is installed)
+    or "bs4" (the original BeautifulSoup path).
+    """
+    backend = backend or HTML_PARSER
+    if backend == "xpath" and lxml_html is not None:
+        rows = parse_library_rows_xpath(html)
+    else:
+        rows = parse_library_rows_bs4(html)
 
+    if fetched_at is None:
+        fetched_at = time.time()
+    return [(track, artist, parse_scrobble_time(text, title, fetched_at)) for track, artist, text, title in rows]
 
-def music_stats(username, api_key, period="7day", api_page=1, scrape_page=1, max_new_rows=25, db_path=DB_PATH):
+
+def parse_time(text, fmt):
+    try:
+        return int(datetime.strptime(text, fmt).replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        return None
+
+
+def parse_scrobble_time(text, title=None, fetched_at=None):
     """
-    PART 1 FUNCTION (required name): music_stats()
-    Inserts <= 25 NEW rows per run total (split between API + scrape).
+    UTC epoch seconds for a library page timestamp, or None.
+    The span's title ("Saturday 18 Oct 2025, 2:05pm") is used when present.
+    Relative text ("4 hours ago") counts back from fetched_at and is floored to
+    its unit, so fetching the page again a few minutes later gives the same time.
+    Dates without a year ("1 Dec 12:05pm") take the latest year not after
+    fetched_at, and digits are a uts. Page times are read as UTC.
     """
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    init_db(cur)
-    conn.commit()
+    if fetched_at is None:
+        fetched_at = time.time()
+    fetched_at = int(fetched_at)
 
-    user_id = get_or_create_id(cur, "users", "username", username)
+    for value in (title, text):
+        if not value:
+            continue
+        value = " ".join(value.split())  # also turns Last.fm's non-breaking spaces into plain ones
+        if value.isdigit():
+            return int(value)
+
+        for fmt in ABSOLUTE_TIME_FORMATS:
+            parsed = parse_time(value, fmt)
+            if parsed is not None:
+                return parsed
+
+        if value.lower() == "just now":
+            return fetched_at // 60 * 60
+        match = RELATIVE_TIME.match(value.lower())
+        if match:
+            count = 1 if match.group(1) in ("a", "an") else int(match.group(1))
+            unit = TIME_UNITS[match.group(2)]
+            return (fetched_at - count * unit) // unit * unit
+
+        # the page's own clock may be up to a day ahead of UTC
+        year = datetime.fromtimestamp(fetched_at, timezone.utc).year
+        for candidate in (year + 1, year, year - 1):
+            parsed = parse_time(f"{value} {candidate}", "%d %b %I:%M%p %Y")
+            if parsed is not None and parsed <= fetched_at + DAY:
+                return parsed
+    return None
+
+
+def legacy_scrobble_times(rows, now):
+    """
+    {id: epoch seconds} for (id, user_id, scrobble_time text) rows stored before
+    times were parsed, in (user_id, id) order. Their fetch time was never recorded,
+    so it is estimated: library pages list newest plays first, so a yearless date
+    takes the latest year that keeps it at or before the user's previous dated row,
+    and relative texts count back from a day after the user's newest dated row
+    (the page only shows relative times for the last day).
+    """
+    times = {}
+    newest = {}
+    previous = {}
+    relative = []
+    for row_id, user_id, text in rows:
+        cleaned = " ".join((text or "").split()).lower()
+        if cleaned == "just now" or RELATIVE_TIME.match(cleaned):
+            relative.append((row_id, user_id, text))
+            continue
+        times[row_id] = parse_scrobble_time(text, fetched_at=previous.get(user_id, now))
+        if times[row_id] is not None:
+            previous[user_id] = times[row_id]
+            newest[user_id] = max(newest.get(user_id, times[row_id]), times[row_id])
 
-    api_budget = max_new_rows // 2
-    scrape_budget = max_new_rows - api_budget
+    # users with no dated rows fall back to the newest dated row overall
+    fallback = max(newest.values(), default=now - DAY)
+    for row_id, user_id, text in relative:
+        times[row_id] = parse_scrobble_time(text, fetched_at=newest.get(user_id, fallback) + DAY)
+    return times
 
-    api_added = collect_api_toptracks(cur, user_id, username, api_key, period, api_page, api_budget)
-    conn.commit()
 
-    scrape_added = collect_recent_scrobbles(cur, user_id, username, scrape_page, scrape_budget)
-    conn.commit()
+def fetch_library_page(username, scrape_page):
+    url = f"{LASTFM_WEB_ROOT}/user/{username}/library?page={scrape_page}"
+    return http_client.get(url).text
 
-    conn.close()
 
+def load_key_caches(cur):
+    return {
+        "artists": KeyCache("artists", ("name",)).warm(cur),
+        "tracks": KeyCache("tracks", ("name", "artist_id")).warm(cur),
+    }
+
+
+def resolve_track_ids(cur, pairs, keys):
+    """
+    Bulk-resolves (track_name, artist_name) pairs to track ids, creating
+    missing artists/tracks. Returns ids in the same order as pairs.
+    """
+    artist_ids = keys["artists"].resolve_many(cur, [artist for _, artist in pairs])
+    track_keys = [(track, artist_ids[artist]) for track, artist in pairs]
+    track_ids = keys["tracks"].resolve_many(cur, track_keys)
+    return [track_ids[k] for k in track_keys]
+
+
+def existing_toptrack_ids(cur, user_id, period, track_ids):
+    found = set()
+    for start in range(0, len(track_ids), CHUNK_SIZE):
+        chunk = track_ids[start:start + CHUNK_SIZE]
+        marks = ", ".join("?" * len(chunk))
+        cur.execute(f"""
+            SELECT track_id FROM lastfm_toptracks
+            WHERE user_id=? AND period=? AND track_id IN ({marks})
+        """, (user_id, period, *chunk))
+        found.update(r[0] for r in cur.fetchall())
+    return found
+
+
+def existing_scrobble_keys(cur, user_id, keys):
+    found = set()
+    for start in range(0, len(keys), CHUNK_SIZE):
+        chunk = keys[start:start + CHUNK_SIZE]
+        values_sql = ", ".join(["(?, ?)"] * len(chunk))
+        cur.execute(f"""
+            SELECT track_id, scrobble_time FROM lastfm_recent_scrobbles
+            WHERE user_id=? AND (track_id, scrobble_time) IN (VALUES {values_sql})
+        """, (user_id, *[v for k in chunk for v in k]))
+        found.update(cur.fetchall())
+    return found
+
+
+def toptrack_rows(tracks):
+    """(track, artist, playcount) for each usable entry of a user.getTopTracks page."""
+    rows = []
+    for t in tracks:
+        track_name = t.get("name")
+        artist_name = t.get("artist", {}).get("name")
+        playcount = int(t.get("playcount", 0))
+
+        if not track_name or not artist_name:
+            continue
+        rows.append((track_name, artist_name, playcount))
+    return rows
+
+
+def new_toptrack_rows(cur, user_id, period, rows, row_limit, keys):
+    """
+    Resolves toptrack_rows() to lastfm_toptracks rows for a period name,
+    keeping only those not stored yet, at most row_limit of them.
+    """
+    period = period_code(period)
+    # each slice holds at most the remaining budget, and duplicates are filtered
+    # out before the write, so the budget is enforced exactly and we never
+    # create artists/tracks for rows we would not have inserted
+    new_rows = []
+    seen = set()
+    pos = 0
+    while len(new_rows) < row_limit and pos < len(rows):
+        batch = rows[pos:pos + row_limit - len(new_rows)]
+        pos += len(batch)
+        track_ids = resolve_track_ids(cur, [(r[0], r[1]) for r in batch], keys)
+        seen |= existing_toptrack_ids(cur, user_id, period, track_ids)
+
+        for (_, _, playcount), track_id in zip(batch, track_ids):
+            if track_id in seen:
+                continue
+            seen.add(track_id)
+            new_rows.append((user_id, period, track_id, playcount))
+    return new_rows
+
+
+def new_scrobble_rows(cur, user_id, rows, row_limit, keys):
+    """Same as new_toptrack_rows() for (track, artist, scrobble_time) rows; rows without a time are skipped."""
+    rows = [r for r in rows if r[2] is not None]
+    new_rows = []
+    seen = set()
+    pos = 0
+    while len(new_rows) < row_limit and pos < len(rows):
+        batch = rows[pos:pos + row_limit - len(new_rows)]
+        pos += len(batch)
+        track_ids = resolve_track_ids(cur, [(r[0], r[1]) for r in batch], keys)
+        batch_keys = [(track_id, r[2]) for r, track_id in zip(batch, track_ids)]
+        seen |= existing_scrobble_keys(cur, user_id, batch_keys)
+
+        for track_id, scrobble_time in batch_keys:
+            if (track_id, scrobble_time) in seen:
+                continue
+            seen.add((track_id, scrobble_time))
+            new_rows.append((user_id, track_id, scrobble_time))
+    return new_rows
+
+
+# rowcount rather than total_changes, which would also count the artists and
+# tracks resolved just before on the same connection
+def insert_toptracks(cur, rows):
+    cur.executemany("""
+        INSERT OR IGNORE INTO lastfm_toptracks (user_id, period, track_id, playcount)
+        VALUES (?, ?, ?, ?)
+    """, rows)
+    return max(cur.rowcount, 0)
+
+
+def insert_scrobbles(cur, rows):
+    cur.executemany("""
+        INSERT OR IGNORE INTO lastfm_recent_scrobbles (user_id, track_id, scrobble_time)
+        VALUES (?, ?, ?)
+    """, rows)
+    return max(cur.rowcount, 0)
+
+
+def get_sync_state(cur, user_id, source):
+    """Returns (last_scrobble_ts, last_page) for a user's source, or (None, None)."""
+    cur.execute("SELECT last_scrobble_ts, last_page FROM sync_state WHERE user_id=? AND source=?",
+                (user_id, source))
+    return cur.fetchone() or (None, None)
+
+
+def save_sync_state(cur, user_id, source, last_scrobble_ts=None, last_page=None):
+    cur.execute("""
+        INSERT INTO sync_state (user_id, source, last_scrobble_ts, last_page, updated_at)
+        VALUES (?, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+        ON CONFLICT (user_id, source) DO UPDATE SET
+            last_scrobble_ts = COALESCE(excluded.last_scrobble_ts, last_scrobble_ts),
+            last_page = COALESCE(excluded.last_page, last_page),
+            updated_at = excluded.updated_at
+    """, (user_id, source, last_scrobble_ts, last_page))
+
+
+def next_toptracks_page(cur, user_id, period):
+    last_page = get_sync_state(cur, user_id, f"toptracks:{period}")[1]
+    return (last_page or 0) + 1
+
+
+def fetch_recent_tracks_page(username, api_key, page, since_ts=None):
+    params = {
+        "method": "user.getRecentTracks",
+        "user": username,
+        "limit": 200,
+        "page": page,
+        "api_key": api_key,
+        "format": "json"
+    }
+    if since_ts is not None:
+        params["from"] = since_ts + 1
+
+    r = http_client.get(LASTFM_API_ROOT, params=params)
+    r.raise_for_status()
+    data = r.json()
+
+    if "error" in data:
+        raise ValueError(f"Last.fm error {data.get('error')}: {data.get('message')}")
+
+    recent = data.get("recenttracks", {})
+    total_pages = int(recent.get("@attr", {}).get("totalPages", 0) or 0)
+    return recent.get("track", []), total_pages
+
+
+def fetch_new_scrobbles(username, api_key, since_ts, row_limit):
+    """
+    Scrobbles newer than since_ts, oldest first, at most row_limit of them.
+    The API lists newest first, so pages are walked from the last one back,
+    stopping as soon as the budget is covered.
+    """
+    first_page, total_pages = fetch_recent_tracks_page(username, api_key, 1, since_ts)
+
+    rows = []
+    for page in range(total_pages, 0, -1):
+        if len(rows) >= row_limit:
+            break
+        if page == 1:
+            tracks = first_page
+        else:
+            tracks = fetch_recent_tracks_page(username, api_key, page, since_ts)[0]
+
+        for t in reversed(tracks):
+            uts = t.get("date", {}).get("uts")
+            track_name = t.get("name")
+            artist_name = t.get("artist", {}).get("#text")
+            # the "now playing" entry has no date yet
+            if not uts or not track_name or not artist_name:
+                continue
+            rows.append((track_name, artist_name, int(uts)))
+
+    return rows[:row_limit]
+
+
+def build_result(username, period, api_page, scrape_page, api_added, scrape_added):
     return {
         "username": username,
         "period": period,
@@ -209,12 +599,143 @@ def music_stats(username, api_key, period="7day", api_page=1, scrape_page=1, max
     }
 
 
+def music_stats(username, api_key, period="7day", api_page=1, scrape_page=1, max_new_rows=25, db_path=DB_PATH,
+                incremental=False):
+    """
+    PART 1 FUNCTION (required name): music_stats()
+    Inserts <= 25 NEW rows per run total (split between API + scrape).
+    With incremental=True the pages come from sync_state instead: top tracks resume
+    after the last fully stored page, back at page 1 once the chart runs out, and
+    scrobbles come from user.getRecentTracks starting after the newest stored
+    scrobble (scrape_page is reported as None).
+    """
+    return music_stats_many([username], api_key, period=period, api_page=api_page, scrape_page=scrape_page,
+                            max_new_rows=max_new_rows, db_path=db_path, workers=2, incremental=incremental)[0]
+
+
+def music_stats_many(usernames, api_key, period="7day", api_page=1, scrape_page=1, max_new_rows=25,
+                     db_path=DB_PATH, workers=DEFAULT_WORKERS, commit_every=COMMIT_EVERY, incremental=False,
+                     parse_workers=PARSE_WORKERS):
+    """
+    Concurrent version of music_stats() for a list of users.
+    Each user's top tracks page and scrobbles page go through a pipeline.run()
+    of fetch (`workers` threads), parse (`parse_workers` threads) and write
+    stages. Only the single write thread touches the writer connection: it
+    resolves ids, inserts the new rows and commits every `commit_every` pages.
+    Returns the music_stats() result dicts in input order.
+    A user whose request fails is reported, not fatal: their result gets an
+    "errors" dict ({source: message}) and the other users carry on.
+    incremental works as in music_stats().
+    """
+    period_code(period)  # an unknown period fails before any request is made
+    conn = db.writer(db_path)
+    cur = conn.cursor()
+
+    api_budget = max_new_rows // 2
+    scrape_budget = max_new_rows - api_budget
+
+    jobs = []
+    added = {}    # (username, source) -> rows inserted
+    errors = {}   # username -> {source: why the fetch failed}
+    written = [0]
+
+    def fetch(job):
+        try:
+            return fetch_job(job)
+        except Exception as e:   # HTTP errors and Last.fm error payloads alike
+            print(f"{job['username']} {job['source']}: request failed ({e})")
+            errors.setdefault(job["username"], {})[job["source"]] = str(e)
+
+    def fetch_job(job):
+        username = job["username"]
+        if job["source"] == "toptracks":
+            job["data"], job["total_pages"] = fetch_api_toptracks_page(username, api_key, period, job["page"])
+            # the chart has shrunk below the saved page since the last run: start over
+            if incremental and not job["data"] and job["page"] > 1:
+                job["page"] = 1
+                job["data"], job["total_pages"] = fetch_api_toptracks_page(username, api_key, period, 1)
+        elif incremental:
+            job["data"] = fetch_new_scrobbles(username, api_key, job["since_ts"], scrape_budget)
+        else:
+            job["data"] = fetch_library_page(username, scrape_page)
+            job["fetched_at"] = time.time()
+        return job
+
+    def parse(job):
+        data = job.pop("data")
+        job["fetched"] = len(data)
+        if job["source"] == "toptracks":
+            job["rows"] = toptrack_rows(data)
+        elif incremental:
+            job["rows"] = data[:scrape_budget]
+            job["last_ts"] = max((r[2] for r in job["rows"]), default=None)
+        else:
+            job["rows"] = parse_library_rows(data, fetched_at=job["fetched_at"])
+        return job
+
+    # jobs stay listed until the results are built, so write() pops the rows and
+    # keeps only counters: memory does not grow with the number of users
+    def write(job):
+        user_id = job["user_id"]
+        rows = job.pop("rows")
+        if job["source"] == "toptracks":
+            rows = new_toptrack_rows(cur, user_id, period, rows, api_budget, keys)
+            count = insert_toptracks(cur, rows)
+            # stopping short of the budget means the whole page was consumed;
+            # after the last page the next run goes back to page 1
+            if incremental and count < api_budget:
+                last_page = job["page"] if job["page"] < job["total_pages"] else 0
+                save_sync_state(cur, user_id, f"toptracks:{period}", last_page=last_page)
+        else:
+            rows = new_scrobble_rows(cur, user_id, rows, scrape_budget, keys)
+            count = insert_scrobbles(cur, rows)
+            if incremental and job["last_ts"] is not None:
+                save_sync_state(cur, user_id, "scrobbles", last_scrobble_ts=job["last_ts"])
+        added[(job["username"], job["source"])] = count
+
+        written[0] += 1
+        if written[0] % commit_every == 0:
+            conn.commit()
+
+    try:
+        keys = load_key_caches(cur)  # shared by every user in this run
+
+        for u in usernames:
+            user_id = get_or_create_id(cur, "users", "username", u)
+            if incremental:
+                page = next_toptracks_page(cur, user_id, period)
+                since_ts = get_sync_state(cur, user_id, "scrobbles")[0]
+            else:
+                page, since_ts = api_page, None
+            jobs.append({"username": u, "user_id": user_id, "source": "toptracks", "page": page})
+            jobs.append({"username": u, "user_id": user_id, "source": "scrobbles", "since_ts": since_ts})
+        conn.commit()
+
+        pipeline.run(jobs, [
+            pipeline.Stage("fetch", fetch, workers),
+            pipeline.Stage("parse", parse, parse_workers),
+            pipeline.Stage("write", write),
+        ])
+    finally:
+        conn.commit()
+        conn.close()
+
+    results = []
+    for job in jobs[::2]:
+        u = job["username"]
+        result = build_result(u, period, job["page"], None if incremental else scrape_page,
+                              added.get((u, "toptracks"), 0), added.get((u, "scrobbles"), 0))
+        if u in errors:
+            result["errors"] = errors[u]
+        results.append(result)
+    return results
+
+
 if __name__ == "__main__":
     API_KEY = "1a47f39cf6c81b0fa73a5b7a85bc9c5f"
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = db.writer(DB_PATH)
     cur = conn.cursor()
-    init_db(cur)
     
     usernames_to_add = [
         ('marscynic', 'Ann Arbor', 'MI'),
@@ -244,5 +765,6 @@ if __name__ == "__main__":
     if not users:
         print("No usernames found in profiles table (data.db).")
     else:
-        for u in users:
-            print(music_stats(u, API_KEY, period="7day", api_page=1, scrape_page=1))
\ No newline at end of file
+        for result in music_stats_many(users, API_KEY, period="7day", incremental=True):
+            print(result)
+        http_client.print_stats()
\ No newline at end of file
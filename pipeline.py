@@ -0,0 +1,109 @@
+# pipeline.py
+# Streaming stages for the collectors. Items from a source flow through a
+# chain of stages (fetch -> parse -> write), each run by its own
+# worker threads and joined by bounded queues. A full queue blocks the stage
+# feeding it, so no more than queue_size items wait between two stages however
+# long the source is, and while one stage waits on the network the others keep
+# parsing and writing: throughput follows the slowest stage, not the sum.
+import queue
+import threading
+import time
+
+QUEUE_SIZE = 16   # items waiting between two stages
+
+_DONE = object()  # end of stream; passed on once every worker of a stage has finished
+
+
+class Stage:
+    """
+    One step of a pipeline: fn(item) runs on `workers` threads and returns the
+    item for the next stage, or None to drop it. A connection is not safe to
+    use from two threads at once, so everything that touches the writer
+    (lookups, inserts, commits) belongs in one stage with workers=1.
+    """
+
+    def __init__(self, name, fn, workers=1):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def stats(self):
+        return {"workers": self.workers, "items": self.items, "busy_seconds": round(self.busy_seconds, 4)}
+
+
+def run(source, stages, queue_size=QUEUE_SIZE):
+    """
+    Pushes every item of source through stages and waits until the last stage
+    is done with them. The first exception (from a stage or the source) stops
+    the feed, lets queued items drain unprocessed and is re-raised here.
+    Returns {stage name: {"workers", "items", "busy_seconds"}}.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    running = [stage.workers for stage in stages]
+    running_lock = threading.Lock()
+    failed = threading.Event()
+    errors = []
+
+    def fail(e):
+        errors.append(e)
+        failed.set()
+
+    def forward(i, item):
+        if i < len(stages):
+            queues[i].put(item)
+
+    def work(i, stage):
+        inbox = queues[i]
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                inbox.put(_DONE)  # for this stage's other workers
+                break
+            if failed.is_set():
+                continue          # keep draining so upstream never blocks on a full queue
+
+            start = time.perf_counter()
+            try:
+                out = stage.fn(item)
+            except BaseException as e:
+                fail(e)
+                continue
+            finally:
+                with stage.lock:
+                    stage.items += 1
+                    stage.busy_seconds += time.perf_counter() - start
+            if out is not None:
+                forward(i + 1, out)
+
+        with running_lock:
+            running[i] -= 1
+            last = running[i] == 0
+        if last:
+            forward(i + 1, _DONE)
+
+    threads = [
+        threading.Thread(target=work, args=(i, stage), name=f"pipeline-{stage.name}-{n}", daemon=True)
+        for i, stage in enumerate(stages)
+        for n in range(stage.workers)
+    ]
+    for t in threads:
+        t.start()
+
+    try:
+        for item in source:
+            if failed.is_set():
+                break
+            queues[0].put(item)
+    except BaseException as e:
+        fail(e)
+    finally:
+        queues[0].put(_DONE)
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise errors[0]
+    return {stage.name: stage.stats() for stage in stages}
@@ -0,0 +1,90 @@
+# rate_limiter.py
+import threading
+import time
+
+# (requests per second, burst size) per host group
+HOST_LIMITS = {
+    "last.fm": (5.0, 5),                  # Last.fm API terms: 5 requests/s averaged
+    "itunes.apple.com": (20 / 60, 20),    # Apple documents roughly 20 calls/minute
+    "open-meteo.com": (10.0, 10),         # free tier: 600 calls/minute
+}
+
+# hosts that count against the same allowance
+HOST_GROUPS = {
+    "ws.audioscrobbler.com": "last.fm",
+    "www.last.fm": "last.fm",
+    "last.fm": "last.fm",
+    "itunes.apple.com": "itunes.apple.com",
+    "geocoding-api.open-meteo.com": "open-meteo.com",
+    "archive-api.open-meteo.com": "open-meteo.com",
+}
+
+MIN_RATE_FRACTION = 1 / 16   # never slow below this fraction of the configured rate
+RECOVERY_FRACTION = 0.05     # rate regained per successful request after a slowdown
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() blocks until a token is available, so any
+    number of worker threads can share one bucket and together stay under `rate`.
+    penalize() halves the rate (e.g. on 403/429) and reward() creeps it back up.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = self.max_rate * MIN_RATE_FRACTION
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Takes one token, sleeping as needed. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def penalize(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def reward(self):
+        if self.rate >= self.max_rate:
+            return
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_FRACTION)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(host):
+    """Returns the shared bucket for a host, or None if the host is not rate limited."""
+    group = HOST_GROUPS.get(host, host)
+    if group not in HOST_LIMITS:
+        return None
+    with _limiters_lock:
+        if group not in _limiters:
+            _limiters[group] = TokenBucket(*HOST_LIMITS[group])
+        return _limiters[group]
+
+
+def set_limit(group, rate, capacity=None):
+    """Overrides a host group's allowance, e.g. when a provider raises our quota."""
+    HOST_LIMITS[group] = (rate, capacity if capacity is not None else max(1, rate))
+    with _limiters_lock:
+        _limiters.pop(group, None)
@@ -0,0 +1,131 @@
+# response_cache.py
+import json
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+import http_client
+
+CACHE_PATH = "http_cache.db"
+MAX_CACHE_BYTES = 50 * 1024 * 1024
+EVICT_BATCH = 200
+
+DAY = 86400
+# endpoint -> (ttl for normal responses, ttl for "not found" responses), in seconds
+ENDPOINT_TTLS = {
+    "itunes.apple.com/search": (30 * DAY, 7 * DAY),
+    "itunes.apple.com/lookup": (30 * DAY, 7 * DAY),
+    "geocoding-api.open-meteo.com/v1/search": (180 * DAY, 7 * DAY),
+}
+
+# free-text params whose case and spacing do not change the answer
+NORMALIZED_PARAMS = {"term", "name"}
+
+_connections = {}
+_sizes = {}   # running (over-)estimate of cached bytes per cache file
+_lock = threading.Lock()
+
+
+def get_connection(cache_path=CACHE_PATH):
+    if cache_path not in _connections:
+        conn = sqlite3.connect(cache_path, check_same_thread=False)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS http_cache (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                body TEXT NOT NULL,
+                negative INTEGER NOT NULL DEFAULT 0,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_http_cache_expires ON http_cache (expires_at)")
+        conn.commit()
+        _connections[cache_path] = conn
+        _sizes[cache_path] = cached_bytes(conn)
+    return _connections[cache_path]
+
+
+def cache_key(url, params=None):
+    """Returns (endpoint, key): host+path, plus the sorted, normalized query string."""
+    parts = urlsplit(url)
+    endpoint = f"{parts.hostname.lower()}{parts.path.rstrip('/')}"
+
+    items = parse_qsl(parts.query) + list((params or {}).items())
+    normalized = []
+    for name, value in items:
+        value = str(value)
+        if name in NORMALIZED_PARAMS:
+            value = " ".join(value.split()).casefold()
+        normalized.append((name, value))
+
+    query = "&".join(f"{name}={value}" for name, value in sorted(normalized))
+    return endpoint, f"{endpoint}?{query}"
+
+
+def lookup(key, cache_path=CACHE_PATH):
+    with _lock:
+        conn = get_connection(cache_path)
+        row = conn.execute(
+            "SELECT body FROM http_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def store(key, endpoint, data, negative, ttl, cache_path=CACHE_PATH):
+    body = json.dumps(data)
+    now = time.time()
+    with _lock:
+        conn = get_connection(cache_path)
+        conn.execute("""
+            INSERT OR REPLACE INTO http_cache (key, endpoint, body, negative, size, fetched_at, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (key, endpoint, body, int(negative), len(body), now, now + ttl))
+        _sizes[cache_path] += len(body)
+        if _sizes[cache_path] > MAX_CACHE_BYTES:
+            _sizes[cache_path] = evict(conn, MAX_CACHE_BYTES)
+        conn.commit()
+
+
+def cached_bytes(conn):
+    return conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+
+
+def evict(conn, max_bytes=MAX_CACHE_BYTES):
+    """Drops expired entries, then the soonest-to-expire ones, until under max_bytes."""
+    conn.execute("DELETE FROM http_cache WHERE expires_at <= ?", (time.time(),))
+    total = cached_bytes(conn)
+    while total > max_bytes:
+        conn.execute("""
+            DELETE FROM http_cache WHERE key IN (
+                SELECT key FROM http_cache ORDER BY expires_at LIMIT ?
+            )
+        """, (EVICT_BATCH,))
+        total = cached_bytes(conn)
+    return total
+
+
+def get_json(url, params=None, is_negative=None, cache_path=CACHE_PATH):
+    """
+    Cached JSON GET. Endpoints listed in ENDPOINT_TTLS are served from the cache
+    while fresh; is_negative(data) marks "not found" answers, which are cached
+    with the shorter negative TTL. Other endpoints always go to the network.
+    """
+    endpoint, key = cache_key(url, params)
+    ttls = ENDPOINT_TTLS.get(endpoint)
+
+    if ttls is not None:
+        cached = lookup(key, cache_path)
+        if cached is not None:
+            return cached
+
+    response = http_client.get(url, params=params)
+    response.raise_for_status()
+    data = response.json()
+
+    if ttls is not None:
+        negative = bool(is_negative and is_negative(data))
+        store(key, endpoint, data, negative, ttls[1] if negative else ttls[0], cache_path)
+    return data
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A fresh database file; every pooled connection to it is closed afterwards."""
+    path = str(tmp_path / "test.db")
+    yield path
+    db.close_all()
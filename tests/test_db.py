@@ -0,0 +1,39 @@
+import threading
+
+import db
+
+
+def test_nested_writer_close_keeps_callers_transaction(db_path):
+    outer = db.writer(db_path)
+    outer.execute("CREATE TABLE IF NOT EXISTS t (x INTEGER)")
+    outer.commit()
+    outer.execute("INSERT INTO t VALUES (1)")
+
+    inner = db.writer(db_path)   # e.g. a helper called while the outer work is open
+    assert inner is outer
+    inner.close()
+
+    assert outer.in_transaction
+    outer.commit()
+    assert outer.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+    outer.close()
+
+
+def test_outermost_close_rolls_back_and_releases(db_path):
+    conn = db.writer(db_path)
+    conn.execute("CREATE TABLE IF NOT EXISTS t (x INTEGER)")
+    conn.commit()
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.close()
+
+    counts = []
+
+    def other_thread():
+        conn = db.writer(db_path)
+        counts.append(conn.execute("SELECT COUNT(*) FROM t").fetchone()[0])
+        conn.close()
+
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    thread.join(timeout=5)
+    assert counts == [0], "the writer lock was not released"
@@ -0,0 +1,45 @@
+import gazetteer
+
+ROWS = [
+    ("Ann Arbor", "MI", "42.27756", "-83.74088"),
+    ("Springfield", "IL", "39.80172", "-89.64371"),
+    ("Springfield", "MA", "42.10148", "-72.58981"),
+    ("Springfield", "MO", "37.21533", "-93.29824"),
+    ("Detroit", "MI", "42.33143", "-83.04575"),
+]
+
+
+def test_exact_match():
+    g = gazetteer.Gazetteer(ROWS)
+    assert g.lookup("Ann Arbor") == (42.27756, -83.74088)
+    assert g.lookup("Detroit") == (42.33143, -83.04575)
+
+
+def test_names_are_normalized():
+    g = gazetteer.Gazetteer(ROWS)
+    assert g.lookup("  ann   ARBOR ") == (42.27756, -83.74088)
+    assert g.lookup("detroit, mi") == (42.33143, -83.04575)
+
+
+def test_duplicate_names_pick_by_state_else_first_listed():
+    g = gazetteer.Gazetteer(ROWS)
+    assert g.lookup("Springfield") == (39.80172, -89.64371)
+    assert g.lookup("Springfield, MA") == (42.10148, -72.58981)
+    assert g.lookup("Springfield", "mo") == (37.21533, -93.29824)
+    assert g.lookup("Springfield, TX") is None
+
+
+def test_unknown_city():
+    g = gazetteer.Gazetteer(ROWS)
+    assert g.lookup("Atlantis") is None
+    assert g.lookup("Ann") is None           # a prefix is not a match
+    assert g.lookup("Zzyzx") is None         # past the last name
+    assert gazetteer.Gazetteer([]).lookup("Detroit") is None
+
+
+def test_load_reads_the_csv(tmp_path):
+    path = tmp_path / "cities.csv"
+    path.write_text("name,state,latitude,longitude\nYpsilanti,MI,42.24115,-83.61299\n", encoding="utf-8")
+    g = gazetteer.Gazetteer.load(str(path))
+    assert len(g) == 1
+    assert g.lookup("Ypsilanti, MI") == (42.24115, -83.61299)
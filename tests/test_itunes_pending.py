@@ -0,0 +1,60 @@
+import time
+
+import db
+import itunes_stats
+import music_stats
+
+
+def add_tracks(db_path, count):
+    conn = db.writer(db_path)
+    cur = conn.cursor()
+    keys = music_stats.load_key_caches(cur)
+    ids = music_stats.resolve_track_ids(cur, [(f"track {i}", "artist") for i in range(count)], keys)
+    conn.commit()
+    conn.close()
+    return ids
+
+
+def set_status(db_path, statuses):
+    conn = db.writer(db_path)
+    conn.executemany("INSERT OR REPLACE INTO enrichment_status (track_id, status, updated_at) VALUES (?, ?, ?)",
+                     statuses)
+    conn.commit()
+    conn.close()
+
+
+def pending_ids(db_path, page_size=2):
+    conn = db.reader(db_path)
+    ids = [row[0] for page in itunes_stats.iter_unenriched_tracks(conn, page_size) for row in page]
+    conn.close()
+    return ids
+
+
+def test_new_tracks_then_retries_due(db_path):
+    ids = add_tracks(db_path, 10)
+    now = int(time.time())
+    old = now - 40 * 24 * 3600
+    set_status(db_path, [(ids[0], "matched", now), (ids[1], "matched", now),
+                         (ids[2], "error", old), (ids[3], "not_found", old),
+                         (ids[4], "error", now), (ids[5], "not_found", now)])
+    # retries sharing a timestamp still come out once each across pages
+    set_status(db_path, [(ids[i], "error", old) for i in (6, 7, 8)])
+
+    assert pending_ids(db_path) == [ids[9], ids[2], ids[6], ids[7], ids[8], ids[3]]
+
+
+def test_scan_mark_follows_the_searched_tracks(db_path, monkeypatch):
+    ids = add_tracks(db_path, 10)
+    monkeypatch.setattr(itunes_stats, "search_itunes", lambda track, artist: {"resultCount": 0, "results": []})
+
+    itunes_stats.itunes_stats({}, db_path, budget=4, workers=3, page_size=2)
+    conn = db.reader(db_path)
+    assert itunes_stats.get_scan_mark(conn.cursor()) == ids[3]
+    conn.close()
+    assert pending_ids(db_path) == ids[4:]
+
+    itunes_stats.itunes_stats({}, db_path, budget=None, workers=3, page_size=2)
+    conn = db.reader(db_path)
+    assert itunes_stats.get_scan_mark(conn.cursor()) == ids[-1]
+    conn.close()
+    assert pending_ids(db_path) == []
@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+from key_cache import KeyCache
+
+
+@pytest.fixture
+def cur():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE artists (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL);
+        CREATE TABLE tracks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            artist_id INTEGER NOT NULL,
+            UNIQUE(name, artist_id)
+        );
+    """)
+    yield conn.cursor()
+    conn.close()
+
+
+def test_least_recently_used_key_is_evicted():
+    cache = KeyCache("artists", ("name",), capacity=3)
+    for i, name in enumerate("abc", start=1):
+        cache.put(name, i)
+
+    assert cache.get("a") == 1   # a hit makes "a" the most recent again
+    cache.put("d", 4)            # so "b" is the one to go
+
+    assert len(cache) == 3
+    assert cache.get("b") is None
+    assert [cache.get(k) for k in "acd"] == [1, 3, 4]
+
+
+def test_resolve_counts_hits_and_misses_and_refreshes_recency(cur):
+    cache = KeyCache("artists", ("name",), capacity=2)
+    ids = cache.resolve_many(cur, ["a", "b", "a"])
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    assert cache.resolve(cur, "a") == ids["a"]   # a hit: "a" is now newer than "b"
+    cache.resolve(cur, "c")
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert cache.get("b") is None and cache.get("a") == ids["a"]
+
+    # an evicted key comes back from the table with the same id, not a new row
+    assert cache.resolve(cur, "b") == ids["b"]
+    assert cur.execute("SELECT COUNT(*) FROM artists").fetchone()[0] == 3
+
+
+def test_same_track_name_under_different_artists(cur):
+    artists = KeyCache("artists", ("name",)).warm(cur)
+    tracks = KeyCache("tracks", ("name", "artist_id")).warm(cur)
+    artist_ids = artists.resolve_many(cur, ["Artist A", "Artist B"])
+
+    keys = [("Intro", artist_ids["Artist A"]), ("Intro", artist_ids["Artist B"])]
+    track_ids = tracks.resolve_many(cur, keys)
+    assert len(set(track_ids.values())) == 2
+    assert tracks.resolve(cur, keys[0]) == track_ids[keys[0]]
+
+    # a fresh cache warmed from the table maps each (name, artist) pair to its own row
+    warmed = KeyCache("tracks", ("name", "artist_id")).warm(cur)
+    assert {k: warmed.get(k) for k in keys} == track_ids
+
+
+def test_warm_keeps_the_newest_rows(cur):
+    cur.executemany("INSERT INTO artists (name) VALUES (?)", [(f"artist {i}",) for i in range(5)])
+    cache = KeyCache("artists", ("name",), capacity=2).warm(cur)
+    assert len(cache) == 2
+    assert cache.get("artist 4") == 5 and cache.get("artist 3") == 4
+    assert cache.get("artist 0") is None
@@ -0,0 +1,87 @@
+import sqlite3
+
+import db
+import music_stats
+
+OLD_TOPTRACKS = """
+    CREATE TABLE lastfm_toptracks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        period TEXT NOT NULL,
+        track_id INTEGER NOT NULL,
+        playcount INTEGER NOT NULL,
+        UNIQUE(user_id, period, track_id)
+    )
+"""
+
+OLD_SCROBBLES = """
+    CREATE TABLE lastfm_recent_scrobbles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        track_id INTEGER NOT NULL,
+        scrobble_time {time_type},
+        UNIQUE(user_id, track_id, scrobble_time)
+    )
+"""
+
+
+def old_database(path, time_type, scrobbles):
+    conn = sqlite3.connect(path)
+    conn.execute(OLD_TOPTRACKS)
+    conn.execute(OLD_SCROBBLES.format(time_type=time_type))
+    conn.executemany("INSERT INTO lastfm_toptracks (user_id, period, track_id, playcount) VALUES (?, ?, ?, ?)",
+                     [(1, "7day", 10, 5), (1, "overall", 10, 50), (2, "7day", 11, 3)])
+    conn.executemany("INSERT INTO lastfm_recent_scrobbles (user_id, track_id, scrobble_time) VALUES (?, ?, ?)",
+                     scrobbles)
+    conn.commit()
+    conn.close()
+
+
+def table_sql(conn, table):
+    return conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+
+
+def test_text_layout_is_rebuilt(db_path):
+    old_database(db_path, "TEXT", [
+        (1, 10, "Saturday 18 Oct 2025, 1:00pm"),
+        (1, 10, "18 Oct 2025, 1:00pm"),   # the same play under another display text
+        (1, 11, "17 Oct 2025, 9:05am"),
+        (2, 11, None),
+    ])
+    db.writer(db_path).close()
+
+    conn = sqlite3.connect(db_path)
+    for table in ("lastfm_toptracks", "lastfm_recent_scrobbles"):
+        assert "id" not in db.table_columns(conn.cursor(), table)
+        assert "WITHOUT ROWID" in table_sql(conn, table)
+
+    codes = music_stats.PERIOD_CODES
+    assert sorted(conn.execute("SELECT user_id, period, track_id, playcount FROM lastfm_toptracks")) == [
+        (1, codes["overall"], 10, 50), (1, codes["7day"], 10, 5), (2, codes["7day"], 11, 3)]
+    assert sorted(conn.execute("SELECT user_id, track_id, scrobble_time FROM lastfm_recent_scrobbles")) == [
+        (1, 10, 1760792400), (1, 11, 1760691900)]
+    conn.close()
+
+
+def test_integer_layout_is_rebuilt(db_path):
+    old_database(db_path, "INTEGER", [(1, 10, 1760792400), (1, 11, 1760691900), (2, 11, None)])
+    db.writer(db_path).close()
+
+    conn = sqlite3.connect(db_path)
+    assert db.table_columns(conn.cursor(), "lastfm_recent_scrobbles")["scrobble_time"] == "INTEGER"
+    assert sorted(conn.execute("SELECT user_id, track_id, scrobble_time FROM lastfm_recent_scrobbles")) == [
+        (1, 10, 1760792400), (1, 11, 1760691900)]
+    conn.close()
+
+
+def test_current_layout_is_left_alone(db_path):
+    db.writer(db_path).close()
+    conn = sqlite3.connect(db_path)
+    before = table_sql(conn, "lastfm_recent_scrobbles")
+    conn.close()
+    db.close_all()
+
+    db.writer(db_path).close()
+    conn = sqlite3.connect(db_path)
+    assert table_sql(conn, "lastfm_recent_scrobbles") == before
+    conn.close()
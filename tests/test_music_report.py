@@ -0,0 +1,66 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the music tables as the first version of music_stats created them
+OLD_SCHEMA = """
+    CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL);
+    CREATE TABLE artists (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL);
+    CREATE TABLE tracks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        artist_id INTEGER NOT NULL,
+        UNIQUE(name, artist_id)
+    );
+    CREATE TABLE lastfm_toptracks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        period TEXT NOT NULL,
+        track_id INTEGER NOT NULL,
+        playcount INTEGER NOT NULL,
+        UNIQUE(user_id, period, track_id)
+    );
+    CREATE TABLE lastfm_recent_scrobbles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        track_id INTEGER NOT NULL,
+        scrobble_time TEXT,
+        UNIQUE(user_id, track_id, scrobble_time)
+    );
+"""
+
+# run in a fresh interpreter, so only what find_music_avg imports is registered
+REPORTS = """
+import json, sys
+import find_music_avg
+path = sys.argv[1]
+print(json.dumps([find_music_avg.load_report("ann", "7day", path),
+                  [r["username"] for r in find_music_avg.iter_all_reports("7day", path)]]))
+"""
+
+
+def test_reports_on_old_layout(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(OLD_SCHEMA)
+    conn.executemany("INSERT INTO users (id, username) VALUES (?, ?)", [(1, "ann"), (2, "bob")])
+    conn.executemany("INSERT INTO artists (id, name) VALUES (?, ?)", [(1, "Artist A"), (2, "Artist B")])
+    conn.executemany("INSERT INTO tracks (id, name, artist_id) VALUES (?, ?, ?)",
+                     [(1, "Song 1", 1), (2, "Song 2", 1), (3, "Song 3", 2)])
+    conn.executemany("INSERT INTO lastfm_toptracks (user_id, period, track_id, playcount) VALUES (?, ?, ?, ?)",
+                     [(1, "7day", 1, 5), (1, "7day", 3, 9), (1, "overall", 2, 40), (2, "7day", 2, 1)])
+    conn.commit()
+    conn.close()
+
+    out = subprocess.run([sys.executable, "-c", REPORTS, path], cwd=REPO, capture_output=True, text=True)
+    assert out.returncode == 0, out.stderr
+    report, usernames = json.loads(out.stdout)
+
+    assert report["username"] == "ann"
+    assert [t["track"] for t in report["top_tracks_by_playcount"]] == ["Song 3", "Song 1"]
+    assert report["num_toptracks_rows_for_period"] == 2
+    assert sorted(usernames) == ["ann", "bob"]
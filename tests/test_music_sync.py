@@ -0,0 +1,52 @@
+import music_stats
+
+
+def weekly_chart(week):
+    # a one-page chart with a few new entries each week
+    return [{"name": f"week {w} song {i}", "artist": {"name": "artist"}, "playcount": "3"}
+            for w in range(week + 1) for i in range(5)]
+
+
+def test_incremental_toptracks_returns_to_page_one(db_path, monkeypatch):
+    week = [0]
+    pages = []
+
+    def fake_toptracks(username, api_key, period, page):
+        pages.append(page)
+        tracks = weekly_chart(week[0])
+        return (tracks, 1) if page == 1 else ([], 1)
+
+    monkeypatch.setattr(music_stats, "fetch_api_toptracks_page", fake_toptracks)
+    monkeypatch.setattr(music_stats, "fetch_new_scrobbles", lambda *args: [])
+
+    added = []
+    for week[0] in range(4):
+        result = music_stats.music_stats("user", "key", db_path=db_path, incremental=True)
+        added.append(result["rows_added_api"])
+
+    assert added == [5, 5, 5, 5]
+    assert pages == [1, 1, 1, 1]
+
+
+def test_incremental_toptracks_restarts_after_empty_page(db_path, monkeypatch):
+    pages = []
+
+    def fake_toptracks(username, api_key, period, page):
+        pages.append(page)
+        tracks = [{"name": f"song {i}", "artist": {"name": "artist"}, "playcount": "1"} for i in range(3)]
+        return (tracks, 1) if page == 1 else ([], 1)
+
+    monkeypatch.setattr(music_stats, "fetch_api_toptracks_page", fake_toptracks)
+    monkeypatch.setattr(music_stats, "fetch_new_scrobbles", lambda *args: [])
+
+    conn = music_stats.db.writer(db_path)
+    cur = conn.cursor()
+    user_id = music_stats.get_or_create_id(cur, "users", "username", "user")
+    music_stats.save_sync_state(cur, user_id, "toptracks:7day", last_page=3)  # saved by an older version
+    conn.commit()
+    conn.close()
+
+    result = music_stats.music_stats("user", "key", db_path=db_path, incremental=True)
+    assert pages == [4, 1]
+    assert result["api_page"] == 1
+    assert result["rows_added_api"] == 3
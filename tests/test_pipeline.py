@@ -0,0 +1,142 @@
+import sqlite3
+import threading
+
+import pytest
+
+import itunes_stats
+import music_stats
+import pipeline
+
+
+def test_run_passes_every_item_through():
+    seen = []
+    stats = pipeline.run(range(2000), [
+        pipeline.Stage("double", lambda x: x * 2, workers=4),
+        pipeline.Stage("odd", lambda x: None if x % 4 else x, workers=3),
+        pipeline.Stage("collect", seen.append),
+    ], queue_size=2)
+    assert sorted(seen) == list(range(0, 4000, 4))
+    assert stats["double"]["items"] == 2000
+    assert stats["collect"]["items"] == 1000
+
+
+def test_run_reraises_first_error():
+    def boom(x):
+        if x == 50:
+            raise ValueError("boom")
+        return x
+
+    with pytest.raises(ValueError, match="boom"):
+        pipeline.run(range(10000), [pipeline.Stage("a", boom, 3), pipeline.Stage("b", lambda x: x)],
+                     queue_size=2)
+
+
+def test_last_stage_runs_on_one_thread():
+    threads = set()
+    pipeline.run(range(500), [
+        pipeline.Stage("fan", lambda x: x, workers=8),
+        pipeline.Stage("write", lambda x: threads.add(threading.get_ident())),
+    ], queue_size=1)
+    assert len(threads) == 1
+
+
+def test_music_stats_many_under_load(db_path, monkeypatch):
+    # every page brings new artists and tracks, so ids are created while pages are written
+    def fake_toptracks(username, api_key, period, page):
+        return [{"name": f"{username} top {i}", "artist": {"name": f"{username} artist {i % 7}"},
+                 "playcount": str(i)} for i in range(30)], 1
+
+    def fake_scrobbles(username, api_key, since_ts, row_limit):
+        return [(f"{username} song {i}", f"{username} artist {i % 5}", 1700000000 + i)
+                for i in range(row_limit)]
+
+    monkeypatch.setattr(music_stats, "fetch_api_toptracks_page", fake_toptracks)
+    monkeypatch.setattr(music_stats, "fetch_new_scrobbles", fake_scrobbles)
+
+    users = [f"user{i}" for i in range(300)]
+    results = music_stats.music_stats_many(users, "key", db_path=db_path, max_new_rows=20, workers=8,
+                                           parse_workers=4, commit_every=1, incremental=True)
+
+    assert [r["username"] for r in results] == users
+    assert all(r["rows_added_total"] == 20 for r in results)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM lastfm_toptracks").fetchone()[0] == 300 * 10
+    assert conn.execute("SELECT COUNT(*) FROM lastfm_recent_scrobbles").fetchone()[0] == 300 * 10
+    conn.close()
+
+
+def test_itunes_stats_under_load(db_path, monkeypatch):
+    conn = music_stats.db.writer(db_path)
+    cur = conn.cursor()
+    keys = music_stats.load_key_caches(cur)
+    music_stats.resolve_track_ids(cur, [(f"track {i}", f"artist {i % 50}") for i in range(600)], keys)
+    conn.commit()
+    conn.close()
+
+    # a new genre for most tracks, so genres are created while batches are written
+    def fake_search(track_name, artist_name):
+        n = int(track_name.split()[1])
+        if n % 10 == 0:
+            return {"resultCount": 0, "results": []}
+        return {"resultCount": 1, "results": [{
+            "trackName": track_name, "artistName": artist_name, "trackId": n,
+            "primaryGenreName": f"genre {n % 300}", "releaseDate": "2020-01-01T00:00:00Z",
+        }]}
+
+    monkeypatch.setattr(itunes_stats, "search_itunes", fake_search)
+    results = itunes_stats.itunes_stats({}, db_path, budget=None, workers=8, page_size=3)
+
+    assert results["tracks_processed"] == 600
+    assert results["tracks_found"] == 540
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM genres").fetchone()[0] == 270
+    assert conn.execute("SELECT COUNT(*) FROM enrichment_status").fetchone()[0] == 600
+    conn.close()
+
+
+def test_music_stats_many_keeps_going_past_a_failed_user(db_path, monkeypatch):
+    def fake_toptracks(username, api_key, period, page):
+        if username == "bad":
+            raise ValueError("Last.fm error 6: User not found")
+        return [{"name": f"{username} top", "artist": {"name": "artist"}, "playcount": "1"}], 1
+
+    def fake_scrobbles(username, api_key, since_ts, row_limit):
+        if username == "bad":
+            raise ConnectionError("connection reset")
+        return [(f"{username} song", "artist", 1700000000)]
+
+    monkeypatch.setattr(music_stats, "fetch_api_toptracks_page", fake_toptracks)
+    monkeypatch.setattr(music_stats, "fetch_new_scrobbles", fake_scrobbles)
+
+    results = music_stats.music_stats_many(["u1", "bad", "u2"], "key", db_path=db_path, incremental=True)
+
+    assert [r["rows_added_total"] for r in results] == [2, 0, 2]
+    assert "errors" not in results[0] and "errors" not in results[2]
+    assert results[1]["errors"] == {"toptracks": "Last.fm error 6: User not found",
+                                    "scrobbles": "connection reset"}
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM lastfm_toptracks").fetchone()[0] == 2
+    conn.close()
+
+
+def test_music_stats_many_releases_written_rows(db_path, monkeypatch):
+    def fake_toptracks(username, api_key, period, page):
+        return [{"name": f"{username} top {i}", "artist": {"name": "artist"}, "playcount": "1"}
+                for i in range(200)], 1
+
+    monkeypatch.setattr(music_stats, "fetch_api_toptracks_page", fake_toptracks)
+    monkeypatch.setattr(music_stats, "fetch_new_scrobbles", lambda *args: [])
+
+    seen = []   # the jobs, as they are left once the pipeline is done
+    original_run = pipeline.run
+
+    def run(source, stages, **kwargs):
+        stats = original_run(source, stages, **kwargs)
+        seen.extend(source)
+        return stats
+
+    monkeypatch.setattr(pipeline, "run", run)
+    music_stats.music_stats_many([f"u{i}" for i in range(20)], "key", db_path=db_path, incremental=True)
+
+    assert len(seen) == 40
+    assert not any("rows" in job or "data" in job for job in seen)
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+import rate_limiter
+
+
+class FakeClock:
+    """Stands in for the time module: sleep() moves monotonic() forward instead of waiting."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.lock = threading.Lock()
+
+    def monotonic(self):
+        with self.lock:
+            return self.now
+
+    def sleep(self, seconds):
+        # like a real sleep, never shorter than a microsecond: a float clock does
+        # not move for the 1e-14 s waits that rounding leaves behind
+        with self.lock:
+            self.now += max(seconds, 1e-6)
+        time.sleep(0)   # let the other threads run
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+
+def test_burst_then_refill_rate(clock):
+    bucket = rate_limiter.TokenBucket(rate=2.0, capacity=3)
+
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]   # the burst is free
+    assert bucket.acquire() == pytest.approx(0.5)                     # then one token per 1/rate
+    assert bucket.acquire() == pytest.approx(0.5)
+
+    clock.now += 10   # idle time refills the bucket, but only up to capacity
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(0.5)
+
+
+def test_penalize_halves_the_rate_and_reward_restores_it(clock):
+    bucket = rate_limiter.TokenBucket(rate=4.0, capacity=1)
+    bucket.acquire()
+    bucket.penalize()
+    assert bucket.rate == 2.0
+    assert bucket.acquire() == pytest.approx(0.5)
+
+    for _ in range(100):
+        bucket.reward()
+    assert bucket.rate == 4.0
+
+    for _ in range(100):
+        bucket.penalize()
+    assert bucket.rate == 4.0 * rate_limiter.MIN_RATE_FRACTION
+
+
+def test_concurrent_acquires_stay_within_rate_and_burst(clock):
+    rate, capacity = 5.0, 4
+    bucket = rate_limiter.TokenBucket(rate, capacity)
+    start = clock.monotonic()
+    taken = []
+    taken_lock = threading.Lock()
+
+    def worker():
+        for _ in range(10):
+            bucket.acquire()
+            with taken_lock:
+                taken.append(clock.monotonic() - start)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=10)
+
+    assert len(taken) == 80
+    # by any time t, at most the burst plus t * rate tokens have been handed out
+    for n, t in enumerate(sorted(taken), start=1):
+        assert n <= capacity + t * rate + 1e-6
@@ -0,0 +1,116 @@
+import pytest
+
+import response_cache
+
+SEARCH_URL = "https://itunes.apple.com/search"
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """(cache path, fake clock, list of requests that reached the network)"""
+    path = str(tmp_path / "cache.db")
+    clock = FakeTime()
+    requests = []
+
+    def fake_get(url, params=None):
+        requests.append((url, params))
+        term = (params or {}).get("term", "")
+        return FakeResponse({"resultCount": 0 if term.startswith("nothing") else 1, "term": term})
+
+    monkeypatch.setattr(response_cache, "time", clock)
+    monkeypatch.setattr(response_cache.http_client, "get", fake_get)
+    yield path, clock, requests
+    conn = response_cache._connections.pop(path, None)
+    if conn is not None:
+        conn.close()
+    response_cache._sizes.pop(path, None)
+
+
+def search(path, term, **extra):
+    return response_cache.get_json(SEARCH_URL, params={"term": term, "media": "music", **extra},
+                                   is_negative=lambda data: data["resultCount"] == 0, cache_path=path)
+
+
+def test_key_ignores_param_order_and_term_case_and_spacing():
+    a = response_cache.cache_key(SEARCH_URL, {"term": "Hey  Jude The Beatles", "media": "music"})
+    b = response_cache.cache_key(SEARCH_URL + "?media=music", {"term": " hey jude  THE BEATLES "})
+    assert a == b
+    assert a[0] == "itunes.apple.com/search"
+    # other params keep their case
+    assert response_cache.cache_key(SEARCH_URL, {"media": "Music"}) != response_cache.cache_key(
+        SEARCH_URL, {"media": "music"})
+
+
+def test_hits_until_the_ttl_runs_out(cache):
+    path, clock, requests = cache
+    ttl, negative_ttl = response_cache.ENDPOINT_TTLS["itunes.apple.com/search"]
+
+    search(path, "Hey Jude")
+    search(path, "hey  jude")     # same key: served from the cache
+    assert len(requests) == 1
+
+    clock.now += ttl - 1
+    search(path, "Hey Jude")
+    assert len(requests) == 1
+    clock.now += 2
+    search(path, "Hey Jude")
+    assert len(requests) == 2
+
+
+def test_not_found_answers_expire_sooner(cache):
+    path, clock, requests = cache
+    ttl, negative_ttl = response_cache.ENDPOINT_TTLS["itunes.apple.com/search"]
+
+    search(path, "nothing here")
+    search(path, "Hey Jude")
+    clock.now += negative_ttl + 1
+    search(path, "nothing here")
+    search(path, "Hey Jude")
+    assert [params["term"] for _, params in requests] == ["nothing here", "Hey Jude", "nothing here"]
+
+
+def test_uncached_endpoints_always_go_to_the_network(cache):
+    path, clock, requests = cache
+    for _ in range(2):
+        response_cache.get_json("https://archive-api.open-meteo.com/v1/archive", params={"latitude": 1},
+                                cache_path=path)
+    assert len(requests) == 2
+
+
+def test_size_bound_evicts_expired_then_soonest_to_expire(cache, monkeypatch):
+    path, clock, requests = cache
+    monkeypatch.setattr(response_cache, "EVICT_BATCH", 1)
+
+    response_cache.store("old", "e", {"x": "a" * 100}, False, 10, path)
+    response_cache.store("short", "e", {"x": "b" * 100}, False, 1000, path)
+    response_cache.store("long", "e", {"x": "c" * 100}, False, 5000, path)
+    entry = response_cache._sizes[path] // 3
+    clock.now += 20   # "old" has expired
+
+    monkeypatch.setattr(response_cache, "MAX_CACHE_BYTES", 2 * entry)
+    response_cache.store("new", "e", {"x": "d" * 100}, False, 3000, path)
+
+    assert response_cache.lookup("old", path) is None
+    assert response_cache.lookup("short", path) is None   # expires first of the live entries
+    assert response_cache.lookup("long", path) is not None
+    assert response_cache.lookup("new", path) is not None
+    assert response_cache._sizes[path] <= 2 * entry
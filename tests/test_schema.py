@@ -0,0 +1,22 @@
+import sqlite3
+
+import db
+import itunes_stats  # noqa: F401  (registers its schema)
+import music_stats
+import weather_stats  # noqa: F401
+
+
+def test_schema_on_existing_database_needs_no_write_lock(db_path, monkeypatch):
+    db.writer(db_path).close()
+    db.close_all()   # the next connection runs every schema function again
+
+    collector = sqlite3.connect(db_path, isolation_level=None)
+    collector.execute("BEGIN IMMEDIATE")   # a collector in the middle of a transaction
+    monkeypatch.setattr(db, "BUSY_TIMEOUT", 0.1)
+    try:
+        conn = db.reader(db_path)
+        assert conn.execute("SELECT COUNT(*) FROM lastfm_periods").fetchone()[0] == len(music_stats.PERIOD_CODES)
+        conn.close()
+    finally:
+        collector.execute("ROLLBACK")
+        collector.close()
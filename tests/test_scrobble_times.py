@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+
+import music_stats
+
+# Saturday 18 Oct 2025, 8:00pm UTC
+FETCHED_AT = 1760817600
+
+
+def utc(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+def test_title_wins_over_relative_text():
+    assert music_stats.parse_scrobble_time("9 hours ago", "Saturday 18 Oct 2025, 1:00pm", FETCHED_AT) \
+        == utc(2025, 10, 18, 13, 0)
+
+
+def test_relative_times_are_floored_to_their_unit():
+    assert music_stats.parse_scrobble_time("4\xa0hours ago", fetched_at=FETCHED_AT + 1234) == utc(2025, 10, 18, 16)
+    assert music_stats.parse_scrobble_time("a minute ago", fetched_at=FETCHED_AT + 30) == utc(2025, 10, 18, 19, 59)
+    assert music_stats.parse_scrobble_time("2 days ago", fetched_at=FETCHED_AT) == utc(2025, 10, 16)
+    assert music_stats.parse_scrobble_time("Just now", fetched_at=FETCHED_AT + 59) == FETCHED_AT
+
+
+def test_absolute_and_yearless_dates():
+    assert music_stats.parse_scrobble_time("17 Oct 2025, 9:05am", fetched_at=FETCHED_AT) == utc(2025, 10, 17, 9, 5)
+    # a yearless date takes the latest year not after the fetch
+    assert music_stats.parse_scrobble_time("1 Dec 12:05pm", fetched_at=FETCHED_AT) == utc(2024, 12, 1, 12, 5)
+    assert music_stats.parse_scrobble_time("18 Oct 9:00pm", fetched_at=FETCHED_AT) == utc(2025, 10, 18, 21)
+
+
+def test_uts_and_unreadable_text():
+    assert music_stats.parse_scrobble_time("1760000000", fetched_at=FETCHED_AT) == 1760000000
+    assert music_stats.parse_scrobble_time("sometime", fetched_at=FETCHED_AT) is None
+    assert music_stats.parse_scrobble_time(None, None, FETCHED_AT) is None
+
+
+def test_legacy_times_follow_page_order():
+    rows = [
+        (1, 1, "3 hours ago"),
+        (2, 1, "17 Oct 2025, 9:00am"),
+        (3, 1, "30 Dec 11:00pm"),    # older than the row above it, so the year before
+        (4, 1, "sometime"),
+        (5, 2, "Just now"),          # no dated rows: counts from the newest dated row overall
+    ]
+    times = music_stats.legacy_scrobble_times(rows, FETCHED_AT)
+    assert times == {
+        1: utc(2025, 10, 18, 6),
+        2: utc(2025, 10, 17, 9),
+        3: utc(2024, 12, 30, 23),
+        4: None,
+        5: utc(2025, 10, 18, 9),
+    }
@@ -0,0 +1,95 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import db
+import find_weather_avg
+import weather_stats
+
+
+def daily_rows(city_id, start, days, rng):
+    rows = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        if rng.random() < 0.05:
+            continue   # a day that was never stored
+        values = [rng.uniform(-10, 95), rng.uniform(-30, 70), rng.uniform(0, 40), rng.uniform(0, 20)]
+        # missing values, and a month with no snow reported at all
+        values = [None if rng.random() < 0.1 else v for v in values]
+        if day.year == 2023 and day.month == 7:
+            values[3] = None
+        rows.append((city_id, day.isoformat(), *values))
+    return rows
+
+
+@pytest.fixture
+def weather_db(db_path):
+    rng = random.Random(7)
+    conn = db.writer(db_path)
+    cur = conn.cursor()
+    city_id = weather_stats.get_or_create_city(cur, conn, "Testville", 42.0, -83.0)
+    # stored out of order, so the running totals are updated behind existing months
+    weather_stats.insert_weather_rows(cur, conn, daily_rows(city_id, date(2023, 3, 1), 500, rng))
+    weather_stats.insert_weather_rows(cur, conn, daily_rows(city_id, date(2022, 1, 10), 300, rng))
+    weather_stats.insert_weather_rows(cur, conn, daily_rows(city_id, date(2025, 1, 1), 40, rng))
+    conn.close()
+    return db_path, city_id
+
+
+def assert_same_averages(cur, city_id, start, end):
+    expected = cur.execute(find_weather_avg.WEATHER_AVG_SQL, (city_id, start, end)).fetchone()
+    got = find_weather_avg.weather_averages(cur, city_id, start, end)
+    assert len(got) == len(expected)
+    for g, e in zip(got, expected):
+        if e is None:
+            assert g is None, (start, end)
+        else:
+            assert g == pytest.approx(e, rel=1e-9), (start, end)
+
+
+def test_matches_plain_average_on_random_ranges(weather_db):
+    db_path, city_id = weather_db
+    rng = random.Random(11)
+    conn = db.reader(db_path)
+    cur = conn.cursor()
+    first = date(2021, 11, 1)
+    for _ in range(300):
+        start = first + timedelta(days=rng.randrange(1300))
+        end = start + timedelta(days=rng.randrange(-5, 700))
+        assert_same_averages(cur, city_id, start.isoformat(), end.isoformat())
+    conn.close()
+
+
+@pytest.mark.parametrize("start, end", [
+    ("2023-03-01", "2023-03-31"),   # one whole month
+    ("2023-03-01", "2024-06-30"),   # whole months only
+    ("2023-07-01", "2023-07-31"),   # a month whose snow is all NULL
+    ("2023-03-15", "2023-03-15"),   # a single day
+    ("2023-03-20", "2023-04-10"),   # two partial months
+    ("2024-08-01", "2024-12-31"),   # a gap between stored days
+    ("2020-01-01", "2020-12-31"),   # before any data
+    ("2023-05-01", "2023-04-01"),   # start after end
+    ("2022-01-01", "2025-12-31"),   # everything
+])
+def test_matches_plain_average_on_edge_ranges(weather_db, start, end):
+    db_path, city_id = weather_db
+    conn = db.reader(db_path)
+    assert_same_averages(conn.cursor(), city_id, start, end)
+    conn.close()
+
+
+def test_rebuilt_rollups_match_incremental_ones(weather_db):
+    db_path, city_id = weather_db
+    conn = db.writer(db_path)
+    cur = conn.cursor()
+    before = cur.execute("SELECT * FROM weather_monthly ORDER BY city_id, month").fetchall()
+    weather_stats.rebuild_weather_rollups(cur)
+    after = cur.execute("SELECT * FROM weather_monthly ORDER BY city_id, month").fetchall()
+    conn.rollback()
+    conn.close()
+
+    assert len(before) == len(after)
+    for b, a in zip(before, after):
+        assert b[:2] == a[:2]
+        assert b[2:] == pytest.approx(a[2:], rel=1e-9)
@@ -0,0 +1,161 @@
+from datetime import date, timedelta
+
+import pytest
+
+import db
+import weather_stats
+
+
+def stored_days(first, last):
+    start, end = date.fromisoformat(first), date.fromisoformat(last)
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+@pytest.fixture
+def weather_cur(db_path):
+    conn = db.writer(db_path)
+    cur = conn.cursor()
+    city_id = weather_stats.get_or_create_city(cur, conn, "Testville", 42.0, -83.0)
+    yield conn, cur, city_id
+    conn.close()
+
+
+def spans(*pairs):
+    return [(date.fromisoformat(a), date.fromisoformat(b)) for a, b in pairs]
+
+
+# (days stored, range asked for, spans expected back)
+MISSING_SPANS_CASES = {
+    "empty table": (
+        [], ("2024-01-01", "2024-01-31"),
+        spans(("2024-01-01", "2024-01-31"))),
+    "fully covered": (
+        stored_days("2024-01-01", "2024-01-31"), ("2024-01-01", "2024-01-31"),
+        []),
+    "covered by a wider stored range": (
+        stored_days("2023-12-01", "2024-02-29"), ("2024-01-01", "2024-01-31"),
+        []),
+    "missing at the start": (
+        stored_days("2024-01-10", "2024-01-31"), ("2024-01-01", "2024-01-31"),
+        spans(("2024-01-01", "2024-01-09"))),
+    "missing at the end": (
+        stored_days("2024-01-01", "2024-01-20"), ("2024-01-01", "2024-01-31"),
+        spans(("2024-01-21", "2024-01-31"))),
+    "missing first and last day": (
+        stored_days("2024-01-02", "2024-01-30"), ("2024-01-01", "2024-01-31"),
+        spans(("2024-01-01", "2024-01-01"), ("2024-01-31", "2024-01-31"))),
+    "interior gaps": (
+        stored_days("2024-01-01", "2024-01-05") + ["2024-01-07"] + stored_days("2024-01-20", "2024-01-31"),
+        ("2024-01-01", "2024-01-31"),
+        spans(("2024-01-06", "2024-01-06"), ("2024-01-08", "2024-01-19"))),
+    "gaps at both edges and inside": (
+        stored_days("2024-01-05", "2024-01-10") + stored_days("2024-01-15", "2024-01-25"),
+        ("2024-01-01", "2024-01-31"),
+        spans(("2024-01-01", "2024-01-04"), ("2024-01-11", "2024-01-14"), ("2024-01-26", "2024-01-31"))),
+    "stored days outside the range only": (
+        stored_days("2023-12-01", "2023-12-31") + stored_days("2024-02-01", "2024-02-10"),
+        ("2024-01-01", "2024-01-31"),
+        spans(("2024-01-01", "2024-01-31"))),
+    "across a year boundary": (
+        stored_days("2023-12-30", "2023-12-31") + stored_days("2024-01-02", "2024-01-03"),
+        ("2023-12-30", "2024-01-03"),
+        spans(("2024-01-01", "2024-01-01"))),
+    "single day range, stored": (
+        ["2024-02-29"], ("2024-02-29", "2024-02-29"),
+        []),
+}
+
+
+@pytest.mark.parametrize("stored, date_range, expected",
+                         MISSING_SPANS_CASES.values(), ids=MISSING_SPANS_CASES.keys())
+def test_missing_spans(weather_cur, stored, date_range, expected):
+    conn, cur, city_id = weather_cur
+    weather_stats.insert_weather_rows(cur, conn, [(city_id, day, 50.0, 30.0, 0.0, 0.0) for day in stored])
+    assert weather_stats.missing_spans(cur, city_id, *date_range) == expected
+
+
+def test_missing_spans_ignores_other_cities(weather_cur):
+    conn, cur, city_id = weather_cur
+    other_id = weather_stats.get_or_create_city(cur, conn, "Otherville", 40.0, -80.0)
+    weather_stats.insert_weather_rows(cur, conn, [(other_id, day, 50.0, 30.0, 0.0, 0.0)
+                                                  for day in stored_days("2024-01-01", "2024-01-31")])
+    assert weather_stats.missing_spans(cur, city_id, "2024-01-01", "2024-01-31") == \
+        spans(("2024-01-01", "2024-01-31"))
+
+
+def fake_archive(start_date, end_date, base):
+    days = stored_days(start_date, end_date)
+    return {"daily": {
+        "time": days,
+        "temperature_2m_max": [base + i for i in range(len(days))],
+        "temperature_2m_min": [base - 10.0] * len(days),
+        "rain_sum": [0.5] * len(days),
+        "snowfall_sum": [None] * len(days),
+    }}
+
+
+@pytest.fixture
+def fake_fetches(monkeypatch):
+    """Cities at fixed coordinates and a fetch_archive() that records its calls."""
+    coords = {
+        "Ann Arbor": (42.27756, -83.74088),     # these two share a 0.25 degree cell
+        "Ann Arbor West": (42.30, -83.80),
+        "Detroit": (42.33143, -83.04575),
+    }
+    calls = []
+
+    def fetch_archive(latitude, longitude, start_date, end_date, model=None):
+        calls.append((latitude, longitude, start_date, end_date, model))
+        return fake_archive(start_date, end_date, base=longitude)
+
+    monkeypatch.setattr(weather_stats, "geocode_city", lambda city, cur=None: coords.get(city))
+    monkeypatch.setattr(weather_stats, "fetch_archive", fetch_archive)
+    return coords, calls
+
+
+def test_cities_in_one_cell_share_a_fetch(db_path, fake_fetches):
+    coords, calls = fake_fetches
+    cell = weather_stats.grid_cell(*coords["Ann Arbor"])
+    assert weather_stats.grid_cell(*coords["Ann Arbor West"]) == cell
+    assert weather_stats.grid_cell(*coords["Detroit"]) != cell
+
+    inserted = weather_stats.backfill_weather("2024-01-01", "2024-01-10", cities=list(coords),
+                                              workers=2, db_name=db_path)
+
+    assert inserted == {"Ann Arbor": 10, "Ann Arbor West": 10, "Detroit": 10}
+    assert len(calls) == 2
+    assert (*weather_stats.cell_coords(cell), "2024-01-01", "2024-01-10", weather_stats.GRID_MODEL) in calls
+
+    # the cell's series is stored under each of its cities
+    conn = db.writer(db_path)
+    rows = conn.execute("""
+        SELECT c.name, w.date, w.max_temp_f FROM daily_weather w JOIN cities c ON c.id = w.city_id
+        ORDER BY c.name, w.date
+    """).fetchall()
+    conn.close()
+    by_city = {}
+    for name, day, max_temp in rows:
+        by_city.setdefault(name, []).append((day, max_temp))
+    assert by_city["Ann Arbor"] == by_city["Ann Arbor West"]
+    assert [day for day, _ in by_city["Ann Arbor"]] == stored_days("2024-01-01", "2024-01-10")
+    assert by_city["Detroit"] != by_city["Ann Arbor"]
+
+
+def test_a_cell_fetches_the_days_any_member_is_missing(db_path, fake_fetches):
+    coords, calls = fake_fetches
+    weather_stats.backfill_weather("2024-01-01", "2024-01-10", cities=["Ann Arbor"], db_name=db_path)
+    calls.clear()
+
+    inserted = weather_stats.backfill_weather("2024-01-01", "2024-01-10", cities=["Ann Arbor", "Ann Arbor West"],
+                                              db_name=db_path)
+
+    assert inserted == {"Ann Arbor": 0, "Ann Arbor West": 10}
+    assert len(calls) == 1
+
+
+def test_no_grid_fetches_each_city(db_path, fake_fetches):
+    coords, calls = fake_fetches
+    weather_stats.backfill_weather("2024-01-01", "2024-01-10", cities=["Ann Arbor", "Ann Arbor West"],
+                                   db_name=db_path, grid=False)
+    assert sorted(c[:2] for c in calls) == sorted([coords["Ann Arbor"], coords["Ann Arbor West"]])
+    assert {c[4] for c in calls} == {None}
@@ -1,10 +1,61 @@
-import requests
-import sqlite3
+import argparse
+from datetime import date, timedelta
 
-def init_db(): # creates data.db & starts cursor
-    conn = sqlite3.connect("data.db")
-    cur = conn.cursor()
+import numpy as np
 
+import db
+import gazetteer
+import http_client
+import pipeline
+import response_cache
+
+GEOCODING_URL = "https://geocoding-api.open-meteo.com/v1/search"
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+CHUNK_DAYS = 366        # days per archive request during a backfill
+BACKFILL_WORKERS = 4    # concurrent archive requests during a backfill
+# cities snapping to the same grid point share a download. The point only stands
+# for the whole cell on a single model's native grid: the default best_match
+# blends in 0.1 degree ERA5-Land, so snapped requests pin ERA5 and its 0.25 grid.
+GRID_MODEL = "era5"
+GRID_DEGREES = 0.25
+
+# one row per city and day, clustered on that key (no separate rowid)
+DAILY_WEATHER_TABLE = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        city_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        max_temp_f REAL,
+        min_temp_f REAL,
+        rain REAL,
+        snow REAL,
+        PRIMARY KEY (city_id, date),
+        FOREIGN KEY(city_id) REFERENCES cities(id)
+    ) WITHOUT ROWID;
+"""
+
+# monthly rollups: per city and month, the total and non-NULL count of each
+# daily_weather column, plus running (cumulative) totals over the city's months,
+# so any whole-month span is one subtraction
+WEATHER_COLUMNS = ("max_temp_f", "min_temp_f", "rain", "snow")
+ROLLUP_COLUMNS = [f"{c}_{agg}" for c in WEATHER_COLUMNS for agg in ("sum", "count")]
+CUM_COLUMNS = [f"cum_{c}" for c in ROLLUP_COLUMNS]
+WEATHER_MONTHLY_TABLE = """
+    CREATE TABLE IF NOT EXISTS weather_monthly (
+        city_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        {columns},
+        PRIMARY KEY (city_id, month),
+        FOREIGN KEY(city_id) REFERENCES cities(id)
+    ) WITHOUT ROWID;
+""".format(columns=",\n        ".join(
+    f"{c} {'REAL' if c.endswith('_sum') else 'INTEGER'} NOT NULL DEFAULT 0" for c in ROLLUP_COLUMNS + CUM_COLUMNS
+))
+
+def init_db(db_name="data.db"): # the writer connection for data.db & a cursor
+    conn = db.writer(db_name)
+    return conn, conn.cursor()
+
+def create_weather_tables(cur):
     cur.execute("""
         CREATE TABLE IF NOT EXISTS cities (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -16,23 +67,63 @@ def init_db(): # creates data.db & starts cursor
          # name TEXT UNIQUE prevents city dupes
          # prevents dupe string data!
 
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS daily_weather (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            city_id INTEGER,
-            date TEXT,
-            max_temp_f REAL,
-            min_temp_f REAL,
-            rain REAL,
-            snow REAL,
-            UNIQUE(city_id, date),
-            FOREIGN KEY(city_id) REFERENCES cities(id)
-        );
-    """) # daily weather table
-         # checks in place to prevent dupes again
+    cur.execute(DAILY_WEATHER_TABLE.format(name="daily_weather"))
+    migrate_daily_weather(cur)
 
-    conn.commit()
-    return conn, cur
+    new_rollups = not db.table_columns(cur, "weather_monthly")
+    cur.execute(WEATHER_MONTHLY_TABLE)
+    if new_rollups:
+        rebuild_weather_rollups(cur)  # databases with weather from before the rollups
+
+db.register_schema(create_weather_tables)
+
+# rebuilds a daily_weather table from the old layout (AUTOINCREMENT id + UNIQUE(city_id, date))
+def migrate_daily_weather(cur):
+    if "id" not in db.table_columns(cur, "daily_weather"):
+        return
+
+    def fill(cur, new):
+        cur.execute(f"""
+            INSERT OR IGNORE INTO {new} (city_id, date, max_temp_f, min_temp_f, rain, snow)
+            SELECT city_id, date, max_temp_f, min_temp_f, rain, snow
+            FROM daily_weather
+            WHERE city_id IS NOT NULL AND date IS NOT NULL
+        """)
+
+    db.rebuild_table(cur, "daily_weather", DAILY_WEATHER_TABLE, fill)
+
+# "YYYY-MM" of the month after one
+def next_month(month):
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + mon // 12:04d}-{mon % 12 + 1:02d}"
+
+# recomputes the rollups of the months first_date..last_date touch for a city,
+# then the running totals from the first of them on (later months shift too)
+def update_weather_rollups(cur, city_id, first_date, last_date):
+    first_month, last_month = first_date[:7], last_date[:7]
+    totals = ", ".join(f"TOTAL({c}), COUNT({c})" for c in WEATHER_COLUMNS)
+    cur.execute(f"""
+        INSERT OR REPLACE INTO weather_monthly (city_id, month, {", ".join(ROLLUP_COLUMNS)})
+        SELECT city_id, substr(date, 1, 7), {totals}
+        FROM daily_weather
+        WHERE city_id = ? AND date >= ? AND date < ?
+        GROUP BY substr(date, 1, 7)
+    """, (city_id, first_month, next_month(last_month)))
+
+    running = ", ".join(f"SUM({c}) OVER (ORDER BY month) AS cum_{c}" for c in ROLLUP_COLUMNS)
+    cur.execute(f"""
+        UPDATE weather_monthly SET {", ".join(f"{c} = r.{c}" for c in CUM_COLUMNS)}
+        FROM (SELECT month, {running} FROM weather_monthly WHERE city_id = ?) AS r
+        WHERE weather_monthly.city_id = ? AND weather_monthly.month = r.month
+          AND weather_monthly.month >= ?
+    """, (city_id, city_id, first_month))
+
+# rollups for every city from scratch (new table, bulk loads)
+def rebuild_weather_rollups(cur):
+    cur.execute("DELETE FROM weather_monthly")
+    cur.execute("SELECT city_id, MIN(date), MAX(date) FROM daily_weather GROUP BY city_id")
+    for city_id, first_date, last_date in cur.fetchall():
+        update_weather_rollups(cur, city_id, first_date, last_date)
 
 # ensures a city name is only stored once
 def get_or_create_city(cur, conn, city, lat, lon):
@@ -46,66 +137,128 @@ def get_or_create_city(cur, conn, city, lat, lon):
     return cur.fetchone()[0]
     # grabs city ID
 
-    # grabs weather records for database & maintains 25 row limit
-def store_daily_weather(cur, conn, city_id, data):
-    days = data["daily"]["time"]
-    max_temps = [c_to_f(t) for t in data["daily"]["temperature_2m_max"]]
-    min_temps = [c_to_f(t) for t in data["daily"]["temperature_2m_min"]]
-    rain = data["daily"]["rain_sum"]
-    snow = data["daily"]["snowfall_sum"]
-
-    # tracks inserts up to 25
-    inserted = 0
-    for i in range(len(days)):
-        if inserted >= 25:
-            break
-
-        try: # inserts day of weather and maintains record with correct city ID
-            cur.execute("""
-                INSERT INTO daily_weather
-                (city_id, date, max_temp_f, min_temp_f, rain, snow)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                city_id,
-                days[i],
-                max_temps[i],
-                min_temps[i],
-                rain[i],
-                snow[i]
-            ))
-            inserted += 1
-        except sqlite3.IntegrityError:
-            continue
-        # skips possible city ID and date dupes
+# an archive response as arrays: the days, then max/min temps (F), rain and snow
+# days Open-Meteo has no value for (None) become NaN
+def weather_columns(data):
+    daily = data["daily"]
+    days = np.array(daily["time"], dtype=str)
+    max_temps = c_to_f(np.array(daily["temperature_2m_max"], dtype=float))
+    min_temps = c_to_f(np.array(daily["temperature_2m_min"], dtype=float))
+    rain = np.array(daily["rain_sum"], dtype=float)
+    snow = np.array(daily["snowfall_sum"], dtype=float)
+    return days, (max_temps, min_temps, rain, snow)
+
+# daily_weather rows for the days not stored yet, at most row_limit of them (None = no limit)
+# skips city ID and date dupes up front so the row limit counts only new days
+def new_weather_rows(cur, city_id, days, columns, row_limit=25):
+    if len(days) == 0:
+        return []
+
+    cur.execute(
+        "SELECT date FROM daily_weather WHERE city_id = ? AND date BETWEEN ? AND ?",
+        (city_id, min(days), max(days))
+    )
+    new = ~np.isin(days, [r[0] for r in cur.fetchall()])
+    new_idx = np.flatnonzero(new)
+    if row_limit is not None:
+        new_idx = new_idx[:row_limit]
 
+    return list(zip([city_id] * len(new_idx), days[new_idx].tolist(),
+                    *[nan_to_none(col[new_idx]) for col in columns]))
+
+# writes new_weather_rows() and keeps the monthly rollups in step, in one transaction
+def insert_weather_rows(cur, conn, rows):
+    cur.executemany("""
+        INSERT OR IGNORE INTO daily_weather
+        (city_id, date, max_temp_f, min_temp_f, rain, snow)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows)
+    inserted = max(cur.rowcount, 0)
+    if inserted:
+        for city_id in {r[0] for r in rows}:
+            dates = [r[1] for r in rows if r[0] == city_id]
+            update_weather_rollups(cur, city_id, min(dates), max(dates))
     conn.commit()
+    return inserted
+
+    # grabs weather records for database & maintains the row limit (None = no limit)
+def store_daily_weather(cur, conn, city_id, data, row_limit=25):
+    days, columns = weather_columns(data)
+    inserted = insert_weather_rows(cur, conn, new_weather_rows(cur, city_id, days, columns, row_limit))
     print(f"{inserted} new rows stored.")
+    return inserted
+
+# NaN -> None so missing values are stored as NULL
+def nan_to_none(values):
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
 
 # converts celsius data into fahrenheit (Open_Meteo grabs celsius data)
+# works on single values and NumPy arrays; missing values stay missing
 def c_to_f(c):
+    if c is None:
+        return None
     return (c * 9/5) + 32
 
-def weather_stats(city: str, start_date: str, end_date: str):
-    geo_url = f"https://geocoding-api.open-meteo.com/v1/search?name={city}&count=1" # converts city name into latitude/longitude for Open-Meteo
-    geo_response = requests.get(geo_url).json()
+# converts city name into latitude/longitude for Open-Meteo
+# reuses stored coordinates when the city is already in the cities table, then
+# tries the offline gazetteer, and only then asks the geocoding API
+# (answers, including "not found", are cached on disk)
+def geocode_city(city, cur=None):
+    if cur is not None:
+        cur.execute("SELECT latitude, longitude FROM cities WHERE name = ?", (city,))
+        row = cur.fetchone()
+        if row and row[0] is not None:
+            return row
 
+    coords = gazetteer.lookup(city)
+    if coords is not None:
+        return coords
+
+    geo_response = response_cache.get_json(
+        GEOCODING_URL, params={"name": city, "count": 1},
+        is_negative=lambda data: "results" not in data
+    )
     if "results" not in geo_response:
+        return None
+
+    return geo_response["results"][0]["latitude"], geo_response["results"][0]["longitude"]
+
+# the GRID_MODEL grid point nearest to a location, as (row, column) indexes
+def grid_cell(latitude, longitude):
+    return round(latitude / GRID_DEGREES), round(longitude / GRID_DEGREES)
+
+# the coordinates of a grid_cell(); backfill requests go here, with GRID_MODEL,
+# so every city in the cell gets the same series
+def cell_coords(cell):
+    return cell[0] * GRID_DEGREES, cell[1] * GRID_DEGREES
+
+# requests weather data; model=None leaves the choice to the API (best_match)
+def fetch_archive(latitude, longitude, start_date, end_date, model=None):
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "start_date": start_date,
+        "end_date": end_date,
+        "daily": "temperature_2m_max,temperature_2m_min,rain_sum,snowfall_sum",
+        "timezone": "auto",
+    }
+    if model:
+        params["models"] = model
+    return http_client.get(ARCHIVE_URL, params=params).json()
+
+def weather_stats(city: str, start_date: str, end_date: str, cur=None):
+    coords = geocode_city(city, cur)
+
+    if coords is None:
         print(f"City '{city}' not found.")
         return None, None, None
     # invalid city names checker
 
-    latitude = geo_response["results"][0]["latitude"]
-    longitude = geo_response["results"][0]["longitude"]
+    latitude, longitude = coords
 
-    weather_url = (
-        "https://archive-api.open-meteo.com/v1/archive?"
-        f"latitude={latitude}&longitude={longitude}"
-        f"&start_date={start_date}&end_date={end_date}"
-        "&daily=temperature_2m_max,temperature_2m_min,rain_sum,snowfall_sum"
-        "&timezone=auto"
-    ) # requests weather data
-
-    data = requests.get(weather_url).json()
+    data = fetch_archive(latitude, longitude, start_date, end_date)
 
     # checks data exists
     if "daily" not in data: 
@@ -115,18 +268,172 @@ def weather_stats(city: str, start_date: str, end_date: str):
     return data, latitude, longitude
     # returns data by category for database
 
-conn, cur = init_db()
+# finds the date spans in [start_date, end_date] that daily_weather has no rows for
+# walks the (city_id, date) index once, using LAG to spot holes between stored days
+def missing_spans(cur, city_id, start_date, end_date):
+    cur.execute("""
+        SELECT prev_date, date FROM (
+            SELECT date, LAG(date) OVER (ORDER BY date) AS prev_date
+            FROM daily_weather
+            WHERE city_id = ? AND date BETWEEN ? AND ?
+        )
+        WHERE prev_date IS NULL OR julianday(date) - julianday(prev_date) > 1
+    """, (city_id, start_date, end_date))
+    breaks = cur.fetchall()
+
+    cur.execute(
+        "SELECT MAX(date) FROM daily_weather WHERE city_id = ? AND date BETWEEN ? AND ?",
+        (city_id, start_date, end_date)
+    )
+    last_stored = cur.fetchone()[0]
+
+    start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    if last_stored is None:
+        return [(start, end)]
+
+    spans = []
+    for prev_date, next_date in breaks:
+        gap_start = start if prev_date is None else date.fromisoformat(prev_date) + timedelta(days=1)
+        gap_end = date.fromisoformat(next_date) - timedelta(days=1)
+        if gap_start <= gap_end:
+            spans.append((gap_start, gap_end))
+
+    tail_start = date.fromisoformat(last_stored) + timedelta(days=1)
+    if tail_start <= end:
+        spans.append((tail_start, end))
+    return spans
+
+# merges overlapping or back-to-back (start, end) date spans
+def merge_spans(spans):
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+# splits a span into pieces of at most chunk_days days
+def chunk_span(start, end, chunk_days=CHUNK_DAYS):
+    while start <= end:
+        chunk_end = min(end, start + timedelta(days=chunk_days - 1))
+        yield start.isoformat(), chunk_end.isoformat()
+        start = chunk_end + timedelta(days=1)
+
+# every city we know about: the cities table plus profile cities
+def known_cities(cur):
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'profiles'")
+    if cur.fetchone():
+        cur.execute("""
+            SELECT name FROM cities WHERE name IS NOT NULL
+            UNION
+            SELECT city FROM profiles WHERE city IS NOT NULL
+        """)
+    else:
+        cur.execute("SELECT name FROM cities WHERE name IS NOT NULL")
+    return [r[0] for r in cur.fetchall()]
+
+def backfill_weather(start_date, end_date, cities=None, chunk_days=CHUNK_DAYS,
+                     workers=BACKFILL_WORKERS, db_name="data.db", grid=True):
+    """
+    Non-interactive backfill of daily weather for many cities (default: every
+    city in cities and profiles). Cities are grouped by grid_cell(), and each cell
+    is downloaded once from GRID_MODEL for the date spans any of its cities is
+    missing (grid=False downloads each city at its own coordinates from the
+    default model instead), split into chunk_days pieces and streamed through a
+    pipeline.run(): `workers` threads fetch while earlier chunks are parsed,
+    fanned out to the cell's cities, deduplicated and written through the writer
+    connection. Returns {city: rows inserted}.
+    """
+    conn, cur = init_db(db_name)
+    try:
+        if cities is None:
+            cities = known_cities(cur)
+
+        cells = {}   # grid cell (or coordinates) -> [(city, city_id)] of the cities that snap to it
+        for city in cities:
+            coords = geocode_city(city, cur)
+            if coords is None:
+                print(f"City '{city}' not found.")
+                continue
+            city_id = get_or_create_city(cur, conn, city, *coords)
+            cells.setdefault(grid_cell(*coords) if grid else coords, []).append((city, city_id))
+
+        # one download per cell, covering the days any of its cities is missing
+        jobs = []
+        for cell, members in cells.items():
+            point = (*cell_coords(cell), GRID_MODEL) if grid else (*cell, None)
+            spans = merge_spans([span for _, city_id in members
+                                 for span in missing_spans(cur, city_id, start_date, end_date)])
+            for span_start, span_end in spans:
+                for chunk_start, chunk_end in chunk_span(span_start, span_end, chunk_days):
+                    jobs.append((point, members, chunk_start, chunk_end))
+
+        inserted = {city: 0 for city in cities}
+
+        def fetch(job):
+            (latitude, longitude, model), members, chunk_start, chunk_end = job
+            try:
+                return job, fetch_archive(latitude, longitude, chunk_start, chunk_end, model)
+            except Exception as e:
+                print(f"{', '.join(city for city, _ in members)} {chunk_start}..{chunk_end}: request failed ({e})")
+
+        def parse(fetched):
+            job, data = fetched
+            if "daily" not in data:
+                print(f"{', '.join(city for city, _ in job[1])} {job[2]}..{job[3]}: no daily weather data found.")
+                return None
+            return job, weather_columns(data)
+
+        # fans the cell's series out to each of its cities; the only stage on the writer
+        def write(parsed):
+            (_, members, chunk_start, chunk_end), (days, columns) = parsed
+            for city, city_id in members:
+                rows = new_weather_rows(cur, city_id, days, columns, row_limit=None)
+                count = insert_weather_rows(cur, conn, rows)
+                print(f"{city} {chunk_start}..{chunk_end}: {count} new rows stored.")
+                inserted[city] += count
+
+        pipeline.run(jobs, [
+            pipeline.Stage("fetch", fetch, workers),
+            pipeline.Stage("parse", parse),
+            pipeline.Stage("write", write),
+        ])
+    finally:
+        conn.close()
+    return inserted
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store daily weather from Open-Meteo.")
+    parser.add_argument("--backfill", nargs=2, metavar=("START", "END"),
+                        help="backfill START..END (YYYY-MM-DD) without prompting")
+    parser.add_argument("--cities", nargs="+", help="cities to backfill (default: all known cities)")
+    parser.add_argument("--chunk-days", type=int, default=CHUNK_DAYS)
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    parser.add_argument("--no-grid", action="store_true",
+                        help="download each city at its own coordinates instead of per grid cell")
+    args = parser.parse_args()
+
+    if args.backfill:
+        totals = backfill_weather(*args.backfill, cities=args.cities,
+                                  chunk_days=args.chunk_days, workers=args.workers, grid=not args.no_grid)
+        for city, rows in totals.items():
+            print(f"{city}: {rows} new rows")
+    else:
+        conn, cur = init_db()
+
+        city = input("Enter city name: ")
+        start_date = input("Enter start date (YYYY-MM-DD): ")
+        end_date = input("Enter end date (YYYY-MM-DD): ")
+        # user input for storing in database
 
-city = input("Enter city name: ")
-start_date = input("Enter start date (YYYY-MM-DD): ")
-end_date = input("Enter end date (YYYY-MM-DD): ")
-# user input for storing in database
+        data, lat, lon = weather_stats(city, start_date, end_date, cur)
+        # grabs data from API
 
-data, lat, lon = weather_stats(city, start_date, end_date)
-# grabs data from API
+        if data:
+            city_id = get_or_create_city(cur, conn, city, lat, lon)
+            store_daily_weather(cur, conn, city_id, data)
 
-if data:
-    city_id = get_or_create_city(cur, conn, city, lat, lon)
-    store_daily_weather(cur, coAnn, city_id, data)
+        conn.close()
 
-conn.close()
+    http_client.print_stats()